@@ -0,0 +1,166 @@
+"""
+Append-only log of answered questions with daily per-user, per-subject rollups.
+
+Every answer appends one row to the attempts table in the same transaction as the
+progress update. compact_attempts() folds new events into attempt_rollups_daily,
+which is what the Analytics mode reads. Run it periodically with
+
+    python -m backend.attempts compact
+"""
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from backend import cache
+from backend.database import connect_game_db
+
+COMPACT_INTERVAL_SECONDS = 60  # Minimum time between compactions triggered by the app
+MAX_SECONDS_ON_QUESTION = 2 * 60 * 60  # Longer gaps are an idle tab, not time on task
+ROLLUP_NAME = "attempts_daily"
+
+_last_compaction = 0.0
+_compaction_lock = threading.Lock()
+
+
+def record_attempts(cursor, subject, user_id, attempts):
+    """
+    Append answered questions to the attempts log using the caller's cursor,
+    so they commit together with the progress update.
+    attempts is a list of (question_id, status, seconds_spent) tuples.
+    """
+    cursor.executemany("""
+        INSERT INTO attempts (user_id, subject, question_id, status, seconds_spent)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (user_id, subject, question_id, status,
+         min(seconds_spent, MAX_SECONDS_ON_QUESTION) if seconds_spent is not None else None)
+        for question_id, status, seconds_spent in attempts
+    ])
+
+def compact_attempts():
+    """
+    Fold attempts logged since the last compaction into the daily rollups.
+    Returns the number of attempts folded in.
+    """
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT last_attempt_id FROM rollup_state WHERE name = ?", (ROLLUP_NAME,))
+    row = cursor.fetchone()
+    last_attempt_id = row[0] if row else 0
+    cursor.execute("SELECT MAX(id) FROM attempts")
+    max_attempt_id = cursor.fetchone()[0] or 0
+    if max_attempt_id <= last_attempt_id:
+        conn.rollback()
+        conn.close()
+        return 0
+
+    cursor.execute("""
+        INSERT INTO attempt_rollups_daily (
+            user_id, subject, day, correct, partially_correct, incorrect, attempts, seconds_spent
+        )
+        SELECT user_id,
+               subject,
+               date(answered_at),
+               SUM(status = 'correct'),
+               SUM(status = 'partially_correct'),
+               SUM(status = 'incorrect'),
+               COUNT(*),
+               SUM(COALESCE(seconds_spent, 0))
+        FROM attempts
+        WHERE id > ? AND id <= ?
+        GROUP BY user_id, subject, date(answered_at)
+        ON CONFLICT(user_id, subject, day)
+        DO UPDATE
+        SET
+            correct = correct + excluded.correct,
+            partially_correct = partially_correct + excluded.partially_correct,
+            incorrect = incorrect + excluded.incorrect,
+            attempts = attempts + excluded.attempts,
+            seconds_spent = seconds_spent + excluded.seconds_spent
+    """, (last_attempt_id, max_attempt_id))
+    cursor.execute("""
+        SELECT DISTINCT subject, user_id
+        FROM attempts
+        WHERE id > ? AND id <= ?
+    """, (last_attempt_id, max_attempt_id))
+    affected = cursor.fetchall()
+    cursor.execute("""
+        INSERT INTO rollup_state (name, last_attempt_id)
+        VALUES (?, ?)
+        ON CONFLICT(name)
+        DO UPDATE SET last_attempt_id = excluded.last_attempt_id
+    """, (ROLLUP_NAME, max_attempt_id))
+    conn.commit()
+    conn.close()
+    for subject, user_id in affected:
+        cache.invalidate(subject, user_id)
+    return max_attempt_id - last_attempt_id
+
+def compact_attempts_if_due():
+    """
+    Compact at most once every COMPACT_INTERVAL_SECONDS per process.
+    """
+    global _last_compaction
+    with _compaction_lock:
+        if time.monotonic() - _last_compaction < COMPACT_INTERVAL_SECONDS:
+            return
+        _last_compaction = time.monotonic()
+    compact_attempts()
+
+def load_daily_rollups(subject, user_id):
+    """
+    Return the user's daily rollups for the subject as a DataFrame ordered by day.
+    The DataFrame is cached and shared, so callers must not modify it.
+    """
+    def load():
+        conn = connect_game_db()
+        daily = pd.read_sql_query("""
+            SELECT day, correct, partially_correct, incorrect, attempts, seconds_spent
+            FROM attempt_rollups_daily
+            WHERE user_id = ? AND subject = ?
+            ORDER BY day
+        """, conn, params=(user_id, subject))
+        conn.close()
+        return daily
+
+    # Compactions run by other processes are picked up within one interval
+    return cache.get_or_load("daily_rollups", (subject, user_id), None, load, ttl=COMPACT_INTERVAL_SECONDS)
+
+def summarize_daily_rollups(daily, today=None):
+    """
+    Turn daily rollups into a calendar of accuracy and time on task, plus streaks.
+
+    Returns (calendar, summary). calendar has one row per day from the first active day
+    to today with attempts, accuracy (partial answers count half), 7-day rolling accuracy
+    and minutes spent. summary holds the current and longest streak of active days.
+    """
+    today = pd.Timestamp(today or pd.Timestamp.now(tz="UTC").date())
+    if daily.empty:
+        return pd.DataFrame(), {"current_streak": 0, "longest_streak": 0}
+
+    daily = daily.assign(day=pd.to_datetime(daily["day"])).set_index("day")
+    days = pd.date_range(daily.index.min(), max(today, daily.index.max()), freq="D")
+    calendar = daily.reindex(days, fill_value=0)
+    calendar.index.name = "day"
+
+    score = calendar["correct"] + 0.5 * calendar["partially_correct"]
+    calendar["accuracy"] = (score / calendar["attempts"]).where(calendar["attempts"] > 0)
+    calendar["rolling_accuracy"] = (score.rolling(7, min_periods=1).sum()
+                                    / calendar["attempts"].rolling(7, min_periods=1).sum())
+    calendar["minutes"] = calendar["seconds_spent"] / 60
+
+    # Length of the run of active days ending on each day
+    active = calendar["attempts"] > 0
+    run_id = (~active).cumsum()
+    streaks = active.astype(int).groupby(run_id).cumsum()
+    current_streak = int(streaks.iloc[-1]) or (int(streaks.iloc[-2]) if len(streaks) > 1 else 0)
+
+    return calendar, {"current_streak": current_streak, "longest_streak": int(streaks.max())}
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["compact"]:
+        sys.exit("Usage: python -m backend.attempts compact")
+    print(f"Compacted {compact_attempts()} attempts")
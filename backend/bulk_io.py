@@ -0,0 +1,273 @@
+"""
+Bulk export and import of user accounts and progress as Parquet or Arrow IPC files.
+
+    python -m backend.bulk_io export <directory> [--format parquet|arrow]
+    python -m backend.bulk_io import <directory>
+
+One file per table (users, user_progress_chemistry, user_progress_physics) is written
+to or read from the directory. Rows are streamed in record batches, so memory use does
+not grow with the size of the tables. Imports validate every file before writing and
+then upsert in large transactions. Users are matched by username: an existing account
+keeps its id and credentials, and imported progress is moved over to it. Running workers pick imported progress up as their
+cached entries are evicted, so import into a live deployment during a quiet period.
+"""
+import argparse
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from backend.database import connect_game_db
+
+BATCH_SIZE = 50_000  # Rows per record batch
+TRANSACTION_ROWS = 500_000  # Rows upserted per transaction on import
+
+PROGRESS_SCHEMA = pa.schema([
+    ("question_id", pa.int64()),
+    ("correct_count", pa.int64()),
+    ("partially_correct_count", pa.int64()),
+    ("incorrect_count", pa.int64()),
+    ("reviewed", pa.bool_()),
+    ("lacking_context", pa.bool_()),
+    ("user_id", pa.int64()),
+    ("updated_at", pa.string()),
+])
+
+# table -> (schema, columns that must not be null, upsert conflict target or None if matched otherwise)
+TABLES = {
+    "users": (
+        pa.schema([
+            ("id", pa.int64()),
+            ("username", pa.string()),
+            ("password_hash", pa.string()),
+            ("created_at", pa.string()),
+        ]),
+        ("id", "username", "password_hash"),
+        None,  # Matched by username, see import_users
+    ),
+    "user_progress_chemistry": (PROGRESS_SCHEMA, ("question_id", "user_id"), "user_id, question_id"),
+    "user_progress_physics": (PROGRESS_SCHEMA, ("question_id", "user_id"), "user_id, question_id"),
+}
+
+FILE_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+# -------------------------
+# Export
+# -------------------------
+def _record_batches(cursor, table):
+    """
+    Stream a table out of the game DB as record batches of BATCH_SIZE rows.
+    """
+    schema = TABLES[table][0]
+    cursor.execute(f"SELECT {', '.join(schema.names)} FROM {table}")
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            # SQLite hands booleans back as 0/1, so build each column first and cast it
+            [pa.array(column).cast(field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+def export_table(table, path, file_format="parquet"):
+    """
+    Export one game-DB table to a Parquet or Arrow IPC file. Returns the number of rows written.
+    """
+    schema = TABLES[table][0]
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    row_count = 0
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = ipc.new_file(path, schema)
+    try:
+        for batch in _record_batches(cursor, table):
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+    finally:
+        writer.close()
+        conn.close()
+    return row_count
+
+def export_all(directory, file_format="parquet"):
+    """
+    Export every table into the directory. Returns {table: rows written}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return {
+        table: export_table(table, os.path.join(directory, table + FILE_EXTENSIONS[file_format]), file_format)
+        for table in TABLES
+    }
+
+# -------------------------
+# Import
+# -------------------------
+def _read_batches(path):
+    """
+    Stream record batches from a Parquet or Arrow IPC file, chosen by its extension.
+    """
+    if path.endswith(FILE_EXTENSIONS["parquet"]):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=BATCH_SIZE)
+    else:
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+def _conform_batch(table, batch):
+    """
+    Check a batch against the table's schema and cast it to the expected types.
+    Raises ValueError if columns are missing, cannot be cast or hold invalid values.
+    """
+    schema, required_columns, _ = TABLES[table]
+    missing = [name for name in schema.names if name not in batch.schema.names]
+    if missing:
+        raise ValueError(f"{table}: missing columns {missing}")
+    try:
+        batch = pa.Table.from_batches([batch.select(schema.names)]).cast(schema)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"{table}: {e}") from e
+
+    for name in required_columns:
+        if batch.column(name).null_count:
+            raise ValueError(f"{table}: column {name} contains nulls")
+    for name in ("correct_count", "partially_correct_count", "incorrect_count"):
+        if name in schema.names and (pc.min(batch.column(name)).as_py() or 0) < 0:
+            raise ValueError(f"{table}: column {name} contains negative counts")
+    return batch
+
+def _upsert_sql(table):
+    schema, _, conflict_target = TABLES[table]
+    key_columns = {column.strip() for column in conflict_target.split(",")}
+    updates = ", ".join(f"{name} = excluded.{name}" for name in schema.names if name not in key_columns)
+    return f"""
+        INSERT INTO {table} ({', '.join(schema.names)})
+        VALUES ({', '.join('?' for _ in schema.names)})
+        ON CONFLICT({conflict_target})
+        DO UPDATE SET {updates}
+    """
+
+def validate_file(table, path):
+    """
+    Validate a whole file without writing anything. Returns the number of rows.
+    """
+    return sum(_conform_batch(table, batch).num_rows for batch in _read_batches(path))
+
+def import_users(path):
+    """
+    Import the accounts of a validated users file. A username that already exists keeps
+    its local id and credentials; a new one keeps its exported id unless that id is taken.
+    Returns (number of rows, {exported id: local id} for the ids that changed).
+    """
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    row_count = 0
+    id_map = {}
+    try:
+        for batch in _read_batches(path):
+            batch = _conform_batch("users", batch)
+            for user_id, username, password_hash, created_at in zip(
+                    *(batch.column(name).to_pylist() for name in batch.schema.names)):
+                cursor.execute("SELECT id FROM users WHERE username = ? ORDER BY id LIMIT 1", (username,))
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute("SELECT 1 FROM users WHERE id = ?", (user_id,))
+                    cursor.execute("""
+                        INSERT INTO users (id, username, password_hash, created_at)
+                        VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                    """, (None if cursor.fetchone() else user_id, username, password_hash, created_at))
+                    local_id = cursor.lastrowid
+                else:
+                    local_id = row[0]
+                if local_id != user_id:
+                    id_map[user_id] = local_id
+            row_count += batch.num_rows
+            conn.commit()
+    finally:
+        conn.close()
+    return row_count, id_map
+
+def import_table(table, path, id_map=None):
+    """
+    Upsert the rows of a validated file into the game DB in large transactions,
+    moving progress of users whose ids changed on import (see import_users) over.
+    Returns the number of rows imported.
+    """
+    sql = _upsert_sql(table)
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    row_count = 0
+    rows_in_transaction = 0
+    try:
+        for batch in _read_batches(path):
+            batch = _conform_batch(table, batch)
+            columns = [batch.column(name).to_pylist() for name in batch.schema.names]
+            if id_map:
+                user_ids = columns[batch.schema.names.index("user_id")]
+                columns[batch.schema.names.index("user_id")] = [id_map.get(user_id, user_id) for user_id in user_ids]
+            cursor.executemany(sql, zip(*columns))
+            row_count += batch.num_rows
+            rows_in_transaction += batch.num_rows
+            if rows_in_transaction >= TRANSACTION_ROWS:
+                conn.commit()
+                rows_in_transaction = 0
+        conn.commit()
+    finally:
+        conn.close()
+    return row_count
+
+def import_all(directory):
+    """
+    Validate and then import every table file found in the directory.
+    Nothing is written unless all files are valid. Returns {table: rows imported}.
+    """
+    paths = {}
+    for table in TABLES:
+        for extension in FILE_EXTENSIONS.values():
+            path = os.path.join(directory, table + extension)
+            if os.path.exists(path):
+                paths[table] = path
+                break
+
+    for table, path in paths.items():
+        validate_file(table, path)
+    counts = {}
+    id_map = {}
+    if "users" in paths:
+        counts["users"], id_map = import_users(paths.pop("users"))
+    for table, path in paths.items():
+        counts[table] = import_table(table, path, id_map)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk export and import of users and progress.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export the game DB tables to a directory.")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--format", choices=sorted(FILE_EXTENSIONS), default="parquet")
+    import_parser = subparsers.add_parser("import", help="Validate and upsert table files from a directory.")
+    import_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "export":
+        counts = export_all(args.directory, args.format)
+    else:
+        try:
+            counts = import_all(args.directory)
+        except ValueError as e:
+            parser.exit(1, f"Import aborted: {e}\n")
+    for table, row_count in counts.items():
+        print(f"{table}: {row_count} rows")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
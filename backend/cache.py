@@ -0,0 +1,133 @@
+"""
+Process-wide cache shared by all sessions, with time-to-live and explicit invalidation.
+
+Every entry belongs to a scope: (subject, None) for data read from a question DB and
+(subject, user_id) for one user's progress. Each scope has a version number that
+invalidate() bumps, so an entry filled before a write is never served after it.
+Entries can also carry the version of the DB they were read from and a TTL, which
+bounds how stale data written by other processes can get. Namespaces holding large
+values, such as whole question rows with their HTML, also have a bound of their own.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 5000  # Entries kept in memory before LRU eviction
+MAX_NAMESPACE_ENTRIES = {"question": 500}  # Tighter LRU bounds for namespaces with large values
+
+# (namespace, scope, key) -> (value, scope_version, source_version, expires_at)
+_entries = OrderedDict()
+# namespace -> OrderedDict of its entry keys, least recently used first, for bounded namespaces
+_namespace_keys = {namespace: OrderedDict() for namespace in MAX_NAMESPACE_ENTRIES}
+_scope_versions = {}  # scope -> number of invalidations so far
+_lock = threading.Lock()
+
+
+def _discard(entry_key):
+    """
+    Must be called with _lock held.
+    """
+    _entries.pop(entry_key, None)
+    namespace_keys = _namespace_keys.get(entry_key[0])
+    if namespace_keys is not None:
+        namespace_keys.pop(entry_key, None)
+
+def _touch(entry_key):
+    """
+    Mark an entry as most recently used. Must be called with _lock held.
+    """
+    _entries.move_to_end(entry_key)
+    namespace_keys = _namespace_keys.get(entry_key[0])
+    if namespace_keys is not None:
+        namespace_keys[entry_key] = None
+        namespace_keys.move_to_end(entry_key)
+
+def _lookup(entry_key, source_version):
+    """
+    Return (hit, value) for an entry that is current. Must be called with _lock held.
+    """
+    entry = _entries.get(entry_key)
+    if entry is None:
+        return False, None
+    value, scope_version, entry_source_version, expires_at = entry
+    if (scope_version != _scope_versions.get(entry_key[1], 0)
+            or entry_source_version != source_version
+            or (expires_at is not None and time.monotonic() >= expires_at)):
+        _discard(entry_key)
+        return False, None
+    _touch(entry_key)
+    return True, value
+
+def _store(entry_key, value, scope_version, source_version, ttl):
+    """
+    Must be called with _lock held.
+    """
+    expires_at = time.monotonic() + ttl if ttl is not None else None
+    _entries[entry_key] = (value, scope_version, source_version, expires_at)
+    _touch(entry_key)
+    namespace_keys = _namespace_keys.get(entry_key[0])
+    if namespace_keys is not None:
+        while len(namespace_keys) > MAX_NAMESPACE_ENTRIES[entry_key[0]]:
+            _discard(next(iter(namespace_keys)))
+    while len(_entries) > MAX_ENTRIES:
+        _discard(next(iter(_entries)))
+
+def get_or_load(namespace, scope, key, loader, ttl=None, source_version=None):
+    """
+    Return the cached value for (namespace, scope, key), calling loader() on a miss.
+    An entry is a miss once its scope was invalidated, its source_version differs
+    or its ttl (seconds) has passed.
+    """
+    entry_key = (namespace, scope, key)
+    with _lock:
+        hit, value = _lookup(entry_key, source_version)
+        if hit:
+            return value
+        scope_version = _scope_versions.get(scope, 0)
+
+    # Load without holding the lock. A write during the load bumps the scope version,
+    # so the value stored below is already outdated and will not be served.
+    value = loader()
+    with _lock:
+        _store(entry_key, value, scope_version, source_version, ttl)
+    return value
+
+def get(namespace, scope, key, source_version=None):
+    """
+    Return the cached value, or None on a miss.
+    """
+    with _lock:
+        return _lookup((namespace, scope, key), source_version)[1]
+
+def put(namespace, scope, key, value, ttl=None, source_version=None):
+    """
+    Store a value loaded by the caller, e.g. one row of a batch read.
+    """
+    with _lock:
+        _store((namespace, scope, key), value, _scope_versions.get(scope, 0), source_version, ttl)
+
+def keys(namespace, scope):
+    """
+    Return the keys cached in a namespace and scope, most recently used last.
+    """
+    with _lock:
+        return [key for entry_namespace, entry_scope, key in _namespace_keys.get(namespace, _entries)
+                if entry_namespace == namespace and entry_scope == scope]
+
+def invalidate(subject, user_id=None):
+    """
+    Make every entry of the scope stale: a user's progress for the subject,
+    or the subject's question data if user_id is None.
+    """
+    scope = (subject, user_id)
+    with _lock:
+        _scope_versions[scope] = _scope_versions.get(scope, 0) + 1
+
+def clear():
+    """
+    Drop every entry, e.g. after a bulk import.
+    """
+    with _lock:
+        _entries.clear()
+        for namespace_keys in _namespace_keys.values():
+            namespace_keys.clear()
@@ -1,19 +1,38 @@
+import json
 import sqlite3
 import os
+import threading
+from contextlib import contextmanager
 
 
-CHEM_DB_PATH = "ChemQuestionsDatabase.db"  # Path to the external database
-PHYS_DB_PATH = "PhysicsQuestionsDataBase.db"
-GAME_DB_PATH = os.path.join(os.path.dirname(__file__), "../questions_game.db")  # Path to the game database in the project root
+# Each path can be overridden with an environment variable of the same name, e.g. for load tests
+CHEM_DB_PATH = os.environ.get("CHEM_DB_PATH", "ChemQuestionsDatabase.db")  # Path to the external database
+PHYS_DB_PATH = os.environ.get("PHYS_DB_PATH", "PhysicsQuestionsDataBase.db")
+GAME_DB_PATH = os.environ.get(
+    "GAME_DB_PATH", os.path.join(os.path.dirname(__file__), "../questions_game.db")
+)  # Path to the game database in the project root
+# Published question-DB versions and the manifest naming the current one per subject
+# (see question_versions.py). Subjects missing from the manifest use the paths above.
+QUESTION_DB_DIR = os.environ.get(
+    "QUESTION_DB_DIR", os.path.join(os.path.dirname(__file__), "../question_dbs")
+)
+MANIFEST_PATH = os.path.join(QUESTION_DB_DIR, "manifest.json")
+
+# subject -> (version, path) this process serves; set from the manifest on first use
+# and switched by question_versions once a newly published version is warm
+_active_versions = {}
+_active_lock = threading.Lock()
+# Versions pinned by the current thread, e.g. for the question a session is answering
+_pinned = threading.local()
 
 
 def connect_chem_db():
     """Connect to the ChemQuestionsDatabase."""
-    return sqlite3.connect(CHEM_DB_PATH)
+    return sqlite3.connect(get_db_path("Chemistry"))
 
 def connect_phys_db():
     """Connect to the PhysicsQuestionsDatabase."""
-    return sqlite3.connect(PHYS_DB_PATH)
+    return sqlite3.connect(get_db_path("Physics"))
 
 def connect_game_db():
     """Connect to the game's progress tracking database."""
@@ -25,37 +44,172 @@ def get_db_connection(subject):
     else:
         return connect_phys_db()
 
-def create_game_database():
-    """Create the progress tracking table in the game's database."""
-    conn = connect_game_db()
+def _legacy_db_path(subject):
+    return CHEM_DB_PATH if subject == "Chemistry" else PHYS_DB_PATH
+
+def read_manifest(path=MANIFEST_PATH):
+    """
+    Return {subject: {"version", "path"}} from the manifest, with absolute paths,
+    or {} if there is no manifest yet.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return {subject: {"version": entry["version"], "path": os.path.join(base_dir, entry["path"])}
+            for subject, entry in manifest.items()}
+
+def get_active_db(subject):
+    """
+    Return (version, path) of the question DB this process serves for new questions.
+    Without a manifest entry, the version of the fixed path is derived from its
+    modification time and size, so replacing the file still invalidates caches.
+    """
+    with _active_lock:
+        if subject not in _active_versions:
+            entry = read_manifest().get(subject)
+            _active_versions[subject] = (entry["version"], entry["path"]) if entry else None
+        active = _active_versions[subject]
+    if active is not None:
+        return active
+    path = _legacy_db_path(subject)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, path
+    return f"{stat.st_mtime_ns}-{stat.st_size}", path
+
+def set_active_db(subject, version, path):
+    """
+    Switch the question DB served for new questions of the subject.
+    """
+    with _active_lock:
+        _active_versions[subject] = (version, path)
+
+def get_db_pin(subject):
+    """
+    Return the (version, path) the current thread uses for the subject.
+    """
+    pins = getattr(_pinned, "versions", None)
+    if pins and subject in pins:
+        return pins[subject]
+    return get_active_db(subject)
+
+@contextmanager
+def pinned_db_versions(pins):
+    """
+    Use the given {subject: (version, path)} on this thread inside the block.
+    Pins whose file has been removed since are ignored.
+    """
+    previous = getattr(_pinned, "versions", None)
+    _pinned.versions = dict(previous or {})
+    _pinned.versions.update({subject: pin for subject, pin in pins.items() if pin and os.path.exists(pin[1])})
+    try:
+        yield
+    finally:
+        _pinned.versions = previous
+
+def get_db_path(subject):
+    """Return the path of the question database for the given subject."""
+    return get_db_pin(subject)[1]
+
+def get_db_version(subject):
+    """
+    Identify the version of a subject's question database in use on this thread.
+    Anything derived from the question bank is cached against this value,
+    so publishing a new version invalidates it. Returns None if the file is missing.
+    """
+    return get_db_pin(subject)[0]
+
+def get_progress_table(subject):
+    """Return the name of the game-DB table holding progress for the given subject."""
+    if subject == "Chemistry":
+        return "user_progress_chemistry"
+    else:
+        return "user_progress_physics"
+
+def _rename_legacy_progress_table(cursor, table):
+    """
+    Early versions keyed progress on question_id alone, so one user's answer
+    overwrote another user's row. Move such a table aside so it can be rebuilt
+    keyed on (user_id, question_id).
+    """
+    pk_columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})") if row[5]]
+    if pk_columns == ["question_id"]:
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+
+def _copy_legacy_progress_table(cursor, table):
+    """
+    Copy the rows of a table moved aside by _rename_legacy_progress_table into the
+    rebuilt one and drop it, including one left over by an interrupted migration.
+    """
+    legacy_table = f"{table}_legacy"
+    if cursor.execute(f"PRAGMA table_info({legacy_table})").fetchall():
+        cursor.execute(f"INSERT OR IGNORE INTO {table} SELECT * FROM {legacy_table}")
+        cursor.execute(f"DROP TABLE {legacy_table}")
+
+def create_game_database(path=None):
+    """Create the progress tracking table in the game's database (or a copy of its schema at path)."""
+    conn = sqlite3.connect(path) if path else connect_game_db()
+    # Autocommit, so the schema changes below run in the one explicit transaction
+    conn.isolation_level = None
     cursor = conn.cursor()
+    # Only takes effect on a new file; maintenance.py converts existing ones in a quiet period
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # Readers and online backups no longer block writers; maintenance.py checkpoints the WAL
+    cursor.execute("PRAGMA journal_mode = WAL")
+
+    # Every process runs this on start; the migration of old progress tables either
+    # happens completely or not at all, and concurrent starts wait for each other
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _create_game_tables(cursor)
+        cursor.execute("COMMIT")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    print(f"Game database created at: {path or GAME_DB_PATH}")
+
+def _create_game_tables(cursor):
+    _rename_legacy_progress_table(cursor, "user_progress_chemistry")
+    _rename_legacy_progress_table(cursor, "user_progress_physics")
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS user_progress_chemistry (
-            question_id INTEGER PRIMARY KEY,
+            question_id INTEGER,
             correct_count INTEGER DEFAULT 0,
             partially_correct_count INTEGER DEFAULT 0,
             incorrect_count INTEGER DEFAULT 0,
             reviewed BOOLEAN DEFAULT 0,
             lacking_context BOOLEAN DEFAULT 0,
             user_id INTEGER,
-            updated_at TIMESTAMP
+            updated_at TIMESTAMP,
+            PRIMARY KEY (user_id, question_id)
         )
     """)
 
     cursor.execute("""
            CREATE TABLE IF NOT EXISTS user_progress_physics (
-               question_id INTEGER PRIMARY KEY,
+               question_id INTEGER,
                correct_count INTEGER DEFAULT 0,
                partially_correct_count INTEGER DEFAULT 0,
                incorrect_count INTEGER DEFAULT 0,
                reviewed BOOLEAN DEFAULT 0,
                lacking_context BOOLEAN DEFAULT 0,
                user_id INTEGER,
-               updated_at TIMESTAMP
+               updated_at TIMESTAMP,
+               PRIMARY KEY (user_id, question_id)
            )
        """)
 
+    # Copy rows over from tables created with the old primary key
+    _copy_legacy_progress_table(cursor, "user_progress_chemistry")
+    _copy_legacy_progress_table(cursor, "user_progress_physics")
+
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY,
@@ -64,10 +218,95 @@ def create_game_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+    # Logins and sign-ups look users up by name
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)")
 
-    conn.commit()
-    conn.close()
-    print(f"Game database created at: {GAME_DB_PATH}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mock_papers (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            paper TEXT,
+            level TEXT,
+            target_marks INTEGER,
+            total_marks INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            submitted_at TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mock_paper_questions (
+            mock_paper_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            status TEXT,
+            PRIMARY KEY (mock_paper_id, position)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            seconds_spent REAL,
+            answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # A user's attempts in a subject, e.g. those logged after a watermark
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attempts_user_subject ON attempts (user_id, subject, id)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attempt_rollups_daily (
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            day TEXT NOT NULL,
+            correct INTEGER DEFAULT 0,
+            partially_correct INTEGER DEFAULT 0,
+            incorrect INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            seconds_spent REAL DEFAULT 0,
+            PRIMARY KEY (user_id, subject, day)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_attempt_id INTEGER NOT NULL
+        )
+    """)
+
+    # Upcoming question IDs per user and practice mode, precomputed by backend.practice_queues
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS practice_queues (
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            queue_key TEXT NOT NULL,
+            question_ids TEXT NOT NULL DEFAULT '[]',
+            due_ids TEXT NOT NULL DEFAULT '[]',
+            position INTEGER NOT NULL DEFAULT 0,
+            db_version TEXT,
+            built_at TIMESTAMP,
+            PRIMARY KEY (user_id, subject, queue_key)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            seconds REAL NOT NULL,
+            file_bytes INTEGER,
+            freelist_pages INTEGER,
+            details TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_runs_task ON maintenance_runs (task)")
 
 
 
@@ -0,0 +1,72 @@
+from backend.question_handler import draw_unreviewed_question
+from backend.question_index import get_question_index
+from backend.reviewed_cache import get_reviewed_mask
+from backend.syllabus import find_syllabus_node, get_syllabus_trie
+
+# Facet -> bitmaps of the question index, one per value (see question_index.py)
+FACETS = {
+    "paper": "paper_masks",
+    "level": "level_masks",
+    "maximum_marks": "marks_masks",
+}
+
+
+def facet_values(subject):
+    """
+    Return {facet: sorted values that occur in the question DB}.
+    """
+    index = get_question_index(subject)
+    return {facet: sorted(value for value in index[key] if value is not None) for facet, key in FACETS.items()}
+
+def selection_mask(subject, selection, syllabus=None):
+    """
+    Bitmap of the questions matching a selection. selection maps facets to lists of
+    values; a question must match one of the values of every facet that has any.
+    syllabus optionally narrows it to a syllabus node ("A » B").
+    """
+    index = get_question_index(subject)
+    mask = index["all_mask"]
+    for facet, values in selection.items():
+        if values:
+            facet_mask = 0
+            for value in values:
+                facet_mask |= index[FACETS[facet]].get(value, 0)
+            mask &= facet_mask
+    if syllabus:
+        node = find_syllabus_node(get_syllabus_trie(subject), syllabus)
+        mask &= node["mask"] if node is not None else 0
+    return mask
+
+def facet_counts(subject, user_id, selection, syllabus=None):
+    """
+    Count the user's unreviewed questions for every value of every facet.
+    A value's count applies the filters of all the other facets, so it is the number
+    of questions the user gets by choosing that value. Only bitmap ANDs and popcounts
+    are involved, so counts stay fast however large the question DB is.
+    Returns ({facet: {value: count}}, number of questions matching the whole selection).
+    """
+    index = get_question_index(subject)
+    unreviewed = index["all_mask"] & ~get_reviewed_mask(subject, user_id)
+    counts = {}
+    for facet, key in FACETS.items():
+        others = {other: values for other, values in selection.items() if other != facet}
+        available = selection_mask(subject, others, syllabus) & unreviewed
+        counts[facet] = {value: (mask & available).bit_count()
+                         for value, mask in index[key].items() if value is not None}
+    total = (selection_mask(subject, selection, syllabus) & unreviewed).bit_count()
+    return counts, total
+
+def syllabus_counts(subject, user_id, selection, node):
+    """
+    Count the user's unreviewed questions under each child of a syllabus node,
+    within the facet selection. Returns {child name: count}.
+    """
+    index = get_question_index(subject)
+    available = selection_mask(subject, selection) & index["all_mask"] & ~get_reviewed_mask(subject, user_id)
+    return {part: (child["mask"] & available).bit_count() for part, child in node["children"].items()}
+
+def draw_faceted_question(subject, user_id, selection, syllabus=None):
+    """
+    Draw an unreviewed question from the intersection of the chosen facets, or None.
+    """
+    return draw_unreviewed_question(subject, user_id, selection_mask(subject, selection, syllabus))
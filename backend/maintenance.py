@@ -0,0 +1,280 @@
+"""
+Maintenance of the game database: online backups, WAL checkpoints, incremental
+vacuum and planner statistics.
+
+    python -m backend.maintenance run                  # scheduler loop, e.g. as a service
+    python -m backend.maintenance once backup [--quiet]
+    python -m backend.maintenance report
+
+The scheduler checks every POLL_SECONDS which tasks are due. Checkpoints and
+backups run at any time, since in WAL mode they do not block writers; vacuum and
+statistics wait for a quiet period, when few answers were recorded lately. Every
+run is logged in maintenance_runs with its duration, the file size and the number
+of free pages left, which `report` summarises.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from backend.database import GAME_DB_PATH, connect_game_db
+
+BACKUP_DIR = os.environ.get("GAME_BACKUP_DIR", os.path.join(os.path.dirname(__file__), "../backups"))
+BACKUP_KEEP = 14  # Backups kept before the oldest are deleted
+BACKUP_PAGES_PER_STEP = 256  # Pages copied per backup step outside WAL mode
+BACKUP_STEP_PAUSE_SECONDS = 0.01  # Pause between steps, so writers can take the lock
+VACUUM_PAGES_PER_STEP = 500  # Free pages released per incremental vacuum transaction
+ANALYSIS_LIMIT = 1000  # Rows sampled per index when gathering statistics
+QUIET_MINUTES = 15  # Window over which activity is measured
+QUIET_MAX_ATTEMPTS = 10  # At most this many answers in the window counts as quiet
+POLL_SECONDS = 60
+MAX_RUNS_KEPT = 5000  # Rows of maintenance_runs kept
+
+# Task -> (seconds between runs, only runs in quiet periods)
+TASKS = {
+    "checkpoint": (5 * 60, False),
+    "backup": (6 * 60 * 60, False),
+    "vacuum": (24 * 60 * 60, True),
+    "optimize": (24 * 60 * 60, True),
+}
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def file_stats(conn):
+    """
+    Return the size of the DB file and its WAL, and the page counts of the DB.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal_path = f"{GAME_DB_PATH}-wal"
+    return {
+        "file_bytes": os.path.getsize(GAME_DB_PATH),
+        "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist_pages,
+    }
+
+# -------------------------
+# Tasks
+# -------------------------
+def checkpoint_wal(conn, quiet=False):
+    """
+    Copy WAL frames back into the DB. In quiet periods the WAL is also truncated,
+    which waits for readers; otherwise the checkpoint skips frames still in use.
+    """
+    mode = "TRUNCATE" if quiet else "PASSIVE"
+    busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    if log_frames < 0:
+        return "not in WAL mode"
+    return f"{mode}: {checkpointed}/{log_frames} frames{' (busy)' if busy else ''}"
+
+def backup_game_db(conn, quiet=False):
+    """
+    Copy the DB to BACKUP_DIR with the backup API and keep the newest BACKUP_KEEP copies.
+    In WAL mode the copy reads one snapshot while writers carry on; otherwise it copies
+    a few pages per step and pauses in between, so writers are only held up briefly.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = os.path.join(BACKUP_DIR, f"questions_game-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}.db")
+    tmp_path = f"{path}.tmp"
+    wal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    target = sqlite3.connect(tmp_path)
+    conn.backup(target, pages=-1 if wal_mode else BACKUP_PAGES_PER_STEP,
+                progress=None if wal_mode else lambda *_: time.sleep(BACKUP_STEP_PAUSE_SECONDS))
+    result = target.execute("PRAGMA quick_check").fetchone()[0]
+    target.close()
+    if result != "ok":
+        os.remove(tmp_path)
+        raise sqlite3.DatabaseError(f"backup failed quick_check: {result}")
+    os.replace(tmp_path, path)
+
+    backups = sorted(name for name in os.listdir(BACKUP_DIR)
+                     if name.startswith("questions_game-") and name.endswith(".db"))
+    for name in backups[:-BACKUP_KEEP]:
+        os.remove(os.path.join(BACKUP_DIR, name))
+    return f"{path} ({os.path.getsize(path)} bytes)"
+
+def vacuum_game_db(conn, quiet=False):
+    """
+    Return free pages to the file system a few at a time, committing in between.
+    A DB created before incremental auto_vacuum is converted with one full VACUUM.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return "converted to incremental auto_vacuum with a full VACUUM"
+
+    # Each step is its own transaction, as the connection is in autocommit mode
+    start_pages = free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free_pages:
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})").fetchall()
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free_pages:
+            break
+        free_pages = remaining
+    return f"freed {start_pages - free_pages} pages"
+
+def optimize_game_db(conn, quiet=False):
+    """
+    Refresh planner statistics, sampling at most ANALYSIS_LIMIT rows per index.
+    PRAGMA optimize only checks every table from SQLite 3.46; older versions
+    analyze everything instead.
+    """
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    if sqlite3.sqlite_version_info >= (3, 46, 0):
+        conn.execute("PRAGMA optimize = 0x10002")
+        action = "PRAGMA optimize"
+    else:
+        conn.execute("ANALYZE")
+        action = "ANALYZE"
+    return f"{action} (analysis_limit {ANALYSIS_LIMIT})"
+
+TASK_FUNCTIONS = {
+    "checkpoint": checkpoint_wal,
+    "backup": backup_game_db,
+    "vacuum": vacuum_game_db,
+    "optimize": optimize_game_db,
+}
+
+def run_task(task, quiet=False):
+    """
+    Run one task and log it in maintenance_runs. Returns (seconds, details, stats).
+    """
+    # Autocommit, so PRAGMAs that cannot run inside a transaction (e.g. VACUUM) work
+    conn = connect_game_db()
+    conn.isolation_level = None
+    started_at = _utc_now()
+    start = time.perf_counter()
+    details = TASK_FUNCTIONS[task](conn, quiet)
+    seconds = time.perf_counter() - start
+    stats = file_stats(conn)
+
+    conn.execute("""
+        INSERT INTO maintenance_runs (task, started_at, seconds, file_bytes, freelist_pages, details)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (task, started_at, seconds, stats["file_bytes"], stats["freelist_pages"], details))
+    conn.execute("""
+        DELETE FROM maintenance_runs
+        WHERE id <= (SELECT MAX(id) FROM maintenance_runs) - ?
+    """, (MAX_RUNS_KEPT,))
+    conn.close()
+    return seconds, details, stats
+
+# -------------------------
+# Scheduling
+# -------------------------
+def _answers_recorded(conn):
+    """
+    Highest attempt id. Ids are never reused (AUTOINCREMENT), so it keeps counting
+    the answers recorded while compaction deletes older rows.
+    """
+    return conn.execute("SELECT MAX(id) FROM attempts").fetchone()[0] or 0
+
+def is_quiet(conn, activity):
+    """
+    Sample the answer count and decide whether the last QUIET_MINUTES were quiet.
+    activity is a deque of (monotonic time, answers recorded) kept by the caller.
+    """
+    now = time.monotonic()
+    activity.append((now, _answers_recorded(conn)))
+    window = QUIET_MINUTES * 60
+    # Keep the newest sample that is at least one window old as the baseline
+    while len(activity) > 1 and now - activity[1][0] >= window:
+        activity.popleft()
+    since, answers = activity[0]
+    return now - since >= window and activity[-1][1] - answers <= QUIET_MAX_ATTEMPTS
+
+def due_tasks(conn, quiet):
+    """
+    Return the tasks whose interval has passed since their last run, leaving the ones
+    that need a quiet period for later when it is busy.
+    """
+    due = []
+    for task, (interval, needs_quiet) in TASKS.items():
+        if needs_quiet and not quiet:
+            continue
+        row = conn.execute("""
+            SELECT started_at
+            FROM maintenance_runs
+            WHERE task = ?
+            ORDER BY id DESC
+            LIMIT 1
+        """, (task,)).fetchone()
+        since = (datetime.now(timezone.utc) - timedelta(seconds=interval)).strftime("%Y-%m-%d %H:%M:%S")
+        if row is None or row[0] <= since:
+            due.append(task)
+    return due
+
+def run_scheduler(poll_seconds=POLL_SECONDS):
+    activity = deque()
+    while True:
+        conn = connect_game_db()
+        quiet = is_quiet(conn, activity)
+        tasks = due_tasks(conn, quiet)
+        conn.close()
+        for task in tasks:
+            try:
+                seconds, details, stats = run_task(task, quiet)
+            except (sqlite3.Error, OSError) as e:
+                print(f"{_utc_now()} {task} failed: {e}")
+                continue
+            print(f"{_utc_now()} {task} took {seconds:.2f}s: {details}; "
+                  f"{stats['file_bytes'] / 2**20:.1f} MB, {stats['freelist_pages']} free pages")
+        time.sleep(poll_seconds)
+
+def maintenance_report():
+    """
+    Return (current file stats, {task: (started_at, seconds, details)} of the last runs).
+    """
+    conn = connect_game_db()
+    stats = file_stats(conn)
+    last_runs = {}
+    for task in TASKS:
+        row = conn.execute("""
+            SELECT started_at, seconds, details
+            FROM maintenance_runs
+            WHERE task = ?
+            ORDER BY id DESC
+            LIMIT 1
+        """, (task,)).fetchone()
+        last_runs[task] = row
+    conn.close()
+    return stats, last_runs
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up and maintain the game database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Run due tasks in a loop.")
+    run_parser.add_argument("--poll-seconds", type=int, default=POLL_SECONDS)
+    once_parser = subparsers.add_parser("once", help="Run one task now.")
+    once_parser.add_argument("task", choices=list(TASKS))
+    once_parser.add_argument("--quiet", action="store_true", help="Run as in a quiet period (e.g. truncate the WAL).")
+    subparsers.add_parser("report", help="Show file size, free pages and the last run of each task.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_scheduler(args.poll_seconds)
+    elif args.command == "once":
+        seconds, details, stats = run_task(args.task, args.quiet)
+        print(f"{args.task} took {seconds:.2f}s: {details}")
+    elif args.command == "report":
+        stats, last_runs = maintenance_report()
+        print(f"{GAME_DB_PATH}: {stats['file_bytes'] / 2**20:.2f} MB, WAL {stats['wal_bytes'] / 2**20:.2f} MB, "
+              f"{stats['page_count']} pages of {stats['page_size']} bytes, {stats['freelist_pages']} free")
+        for task, row in last_runs.items():
+            if row is None:
+                print(f"{task:<11} never run")
+            else:
+                started_at, seconds, details = row
+                print(f"{task:<11} {started_at}  {seconds:8.2f}s  {details}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import random
+
+from backend.database import connect_game_db
+from backend.progress import update_progress_batch
+from backend.question_handler import fetch_questions
+from backend.question_index import get_question_index, mask_to_ids
+from backend.reviewed_cache import get_reviewed_mask
+from backend.syllabus import get_syllabus_trie
+
+
+def select_mock_paper_questions(subject, user_id, paper, level, target_marks):
+    """
+    Choose unreviewed questions for a mock paper without touching the question DB.
+
+    Candidates come from the precomputed paper and level pools of the question index,
+    leaving out the sub-parts that should_exclude_question filters from progress.
+    They are grouped by top-level syllabus topic and taken round-robin, so the paper
+    covers as many topics as possible, until the marks reach target_marks.
+    Returns (question_ids, total_marks).
+    """
+    index = get_question_index(subject)
+    trie = get_syllabus_trie(subject)
+    candidates = (index["paper_masks"].get(paper, 0)
+                  & index["level_masks"].get(level, 0)
+                  & index["valid_mask"]
+                  & ~get_reviewed_mask(subject, user_id))
+
+    # One shuffled pool per syllabus topic, plus one for questions without a syllabus link
+    pools = [mask_to_ids(index, candidates & node["mask"]) for node in trie["children"].values()]
+    pools.append(mask_to_ids(index, candidates & ~trie["mask"]))
+    pools = [pool for pool in pools if pool]
+    for pool in pools:
+        random.shuffle(pool)
+    random.shuffle(pools)
+
+    positions = index["positions"]
+    marks = index["marks"]
+    chosen = []
+    chosen_set = set()
+    total_marks = 0
+    while pools and total_marks < target_marks:
+        for pool in pools:
+            # Take the first question from this topic that still fits the paper
+            remaining_marks = target_marks - total_marks
+            for i, question_id in enumerate(pool):
+                if question_id not in chosen_set and marks[positions[question_id]] <= remaining_marks:
+                    del pool[:i + 1]
+                    chosen.append(question_id)
+                    chosen_set.add(question_id)
+                    total_marks += marks[positions[question_id]]
+                    break
+            else:
+                pool.clear()  # Nothing in this topic fits any more
+            if total_marks >= target_marks:
+                break
+        pools = [pool for pool in pools if pool]
+
+    return chosen, total_marks
+
+def create_mock_paper(subject, user_id, paper, level, target_marks):
+    """
+    Assemble a mock paper and store it in the game DB.
+    Returns the new mock paper ID, or None if no unreviewed questions match.
+    """
+    question_ids, total_marks = select_mock_paper_questions(subject, user_id, paper, level, target_marks)
+    if not question_ids:
+        return None
+
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO mock_papers (user_id, subject, paper, level, target_marks, total_marks)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, subject, paper, level, target_marks, total_marks))
+    mock_paper_id = cursor.lastrowid
+    cursor.executemany("""
+        INSERT INTO mock_paper_questions (mock_paper_id, position, question_id)
+        VALUES (?, ?, ?)
+    """, [(mock_paper_id, position, question_id) for position, question_id in enumerate(question_ids, 1)])
+    conn.commit()
+    conn.close()
+    return mock_paper_id
+
+def load_mock_paper(mock_paper_id, user_id):
+    """
+    Load a stored mock paper with all of its question rows, fetched in one batch.
+    Returns a dict, or None if the paper does not exist or belongs to another user.
+    """
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT subject, paper, level, target_marks, total_marks, created_at, submitted_at
+        FROM mock_papers
+        WHERE id = ? AND user_id = ?
+    """, (mock_paper_id, user_id))
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
+        return None
+    cursor.execute("""
+        SELECT question_id
+        FROM mock_paper_questions
+        WHERE mock_paper_id = ?
+        ORDER BY position
+    """, (mock_paper_id,))
+    question_ids = [question_row[0] for question_row in cursor.fetchall()]
+    conn.close()
+
+    subject, paper, level, target_marks, total_marks, created_at, submitted_at = row
+    return {
+        "id": mock_paper_id,
+        "subject": subject,
+        "paper": paper,
+        "level": level,
+        "target_marks": target_marks,
+        "total_marks": total_marks,
+        "created_at": created_at,
+        "submitted_at": submitted_at,
+        "questions": fetch_questions(subject, question_ids),
+    }
+
+def submit_mock_paper(mock_paper_id, subject, user_id, results, seconds_per_question=None):
+    """
+    Record the outcome of every question on a mock paper in one batch.
+    results maps question_id -> status ("correct", "partially_correct" or "incorrect").
+    """
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.executemany("""
+        UPDATE mock_paper_questions
+        SET status = ?
+        WHERE mock_paper_id = ? AND question_id = ?
+    """, [(status, mock_paper_id, question_id) for question_id, status in results.items()])
+    cursor.execute("""
+        UPDATE mock_papers
+        SET submitted_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND user_id = ?
+    """, (mock_paper_id, user_id))
+    conn.commit()
+    conn.close()
+
+    update_progress_batch(subject, results, user_id, seconds_per_question)
@@ -0,0 +1,284 @@
+"""
+Precomputed per-user practice queues.
+
+    python -m backend.practice_queues build [--processes N] [--active-days N]
+
+Run nightly. For every user who answered questions recently, the job orders the
+upcoming question IDs of each subject: one queue for Random mode, one for Random
+mode focused on weak topics, one per paper and one per syllabus node the user has
+practised. Serving a question pops the next queued ID the user has not reviewed.
+When a queue is missing, used up or built for another question-DB version, the
+caller draws live instead, and the queue is registered for the next build. Serving
+keeps queue positions in the session and writes them back in batches.
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import streamlit as st
+
+from backend.database import connect_game_db
+from backend.question_handler import fetch_question
+from backend.question_index import get_question_index, mask_to_ids
+from backend.reviewed_cache import get_reviewed_mask
+from backend.syllabus import find_syllabus_node, get_syllabus_trie
+from backend.weighted_sampling import compute_question_weights
+
+QUEUE_LENGTH = 100  # Question IDs stored per queue
+ACTIVE_DAYS = 14  # Users who answered a question this recently get queues
+MAX_QUEUE_AGE_HOURS = 36  # Older queues are stale, e.g. when a nightly build was missed
+QUEUE_FLUSH_SERVES = 10  # Serves and misses a session collects before writing queue positions back
+
+RANDOM_QUEUE = "random"
+WEIGHTED_QUEUE = "weighted"
+
+
+def paper_queue_key(paper):
+    return f"paper:{paper}"
+
+def syllabus_queue_key(syllabus):
+    return f"syllabus:{syllabus}"
+
+# -------------------------
+# Building
+# -------------------------
+def _shuffled(ids):
+    ids = list(ids)
+    random.shuffle(ids)
+    return ids[:QUEUE_LENGTH]
+
+def build_queue(subject, user_id, queue_key, reviewed_mask):
+    """
+    Order the upcoming questions of one queue. Returns (question_ids, due_ids), where
+    due_ids are queued questions the user already reviewed but should see again.
+    """
+    index = get_question_index(subject)
+    if queue_key == WEIGHTED_QUEUE:
+        # Weighted sampling without replacement: keep the largest random() ** (1 / weight)
+        question_ids, weights = compute_question_weights(subject, user_id)
+        keyed = ((random.random() ** (1.0 / weight), question_id)
+                 for question_id, weight in zip(question_ids, weights) if weight > 0)
+        queue = [question_id for _, question_id in heapq.nlargest(QUEUE_LENGTH, keyed)]
+        positions = index["positions"]
+        return queue, [question_id for question_id in queue if reviewed_mask >> positions[question_id] & 1]
+
+    if queue_key == RANDOM_QUEUE:
+        candidates = index["all_mask"]
+    elif queue_key.startswith("paper:"):
+        candidates = index["paper_masks"].get(queue_key[len("paper:"):], 0)
+    elif queue_key.startswith("syllabus:"):
+        node = find_syllabus_node(get_syllabus_trie(subject), queue_key[len("syllabus:"):])
+        candidates = node["mask"] if node is not None else 0
+    else:
+        candidates = 0
+    return _shuffled(mask_to_ids(index, candidates & ~reviewed_mask)), []
+
+def build_user_queues(subject, user_id, queue_keys):
+    """
+    Build every queue of one user and subject.
+    Returns (subject, user_id, db_version, [(queue_key, question_ids, due_ids)]).
+    """
+    reviewed_mask = get_reviewed_mask(subject, user_id)
+    queues = [(queue_key, *build_queue(subject, user_id, queue_key, reviewed_mask)) for queue_key in queue_keys]
+    return subject, user_id, get_question_index(subject)["version"], queues
+
+def _build_task(task):
+    return build_user_queues(*task)
+
+def _active_users(active_days):
+    """
+    Return {(subject, user_id): queue keys} for users who answered recently,
+    including the paper and syllabus queues they registered by practising.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=active_days)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT DISTINCT subject, user_id
+        FROM attempts
+        WHERE answered_at >= ?
+    """, (since,))
+    users = {(subject, user_id): {RANDOM_QUEUE, WEIGHTED_QUEUE} for subject, user_id in cursor.fetchall()}
+    cursor.execute("SELECT subject, user_id, queue_key FROM practice_queues")
+    for subject, user_id, queue_key in cursor.fetchall():
+        if (subject, user_id) in users:
+            users[(subject, user_id)].add(queue_key)
+    conn.close()
+
+    for (subject, _), queue_keys in users.items():
+        queue_keys.update(paper_queue_key(paper) for paper in get_question_index(subject)["paper_masks"])
+    return users
+
+def build_all_queues(processes=None, active_days=ACTIVE_DAYS):
+    """
+    Rebuild the queues of every active user across a process pool and store them
+    in one transaction. Returns the number of queues written.
+    """
+    tasks = [(subject, user_id, sorted(queue_keys))
+             for (subject, user_id), queue_keys in _active_users(active_days).items()]
+    if not tasks:
+        return 0
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_build_task, tasks, chunksize=max(1, len(tasks) // (4 * processes))))
+
+    rows = [(user_id, subject, queue_key, json.dumps(question_ids), json.dumps(due_ids), version)
+            for subject, user_id, version, queues in results
+            for queue_key, question_ids, due_ids in queues]
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO practice_queues (user_id, subject, queue_key, question_ids, due_ids, position, db_version, built_at)
+        VALUES (?, ?, ?, ?, ?, 0, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id, subject, queue_key)
+        DO UPDATE
+        SET
+            question_ids = excluded.question_ids,
+            due_ids = excluded.due_ids,
+            position = 0,
+            db_version = excluded.db_version,
+            built_at = CURRENT_TIMESTAMP
+    """, rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+# -------------------------
+# Serving
+# -------------------------
+def _session_queues():
+    """
+    Queues loaded by this session: (subject, user_id, queue_key) -> queue state, or None
+    for a queue that does not exist yet.
+    """
+    if "practice_queues" not in st.session_state:
+        st.session_state.practice_queues = {}
+        st.session_state.practice_queue_writes = 0
+    return st.session_state.practice_queues
+
+def _load_queue(subject, user_id, queue_key):
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT question_ids, due_ids, position, db_version, built_at
+        FROM practice_queues
+        WHERE user_id = ? AND subject = ? AND queue_key = ?
+    """, (user_id, subject, queue_key))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    question_ids, due_ids, position, db_version, built_at = row
+    return {
+        "question_ids": json.loads(question_ids),
+        "due_ids": set(json.loads(due_ids)),
+        "position": position,
+        "flushed_position": position,
+        "db_version": db_version,
+        "built_at": built_at,
+    }
+
+def flush_queue_positions():
+    """
+    Write this session's queue positions back and register the queues it found missing,
+    so that the next build fills them. Positions only matter to the next session: one
+    that lost its last few serves skips the questions answered since via the reviewed bitmap.
+    """
+    queues = _session_queues()
+    positions = [(state["position"], user_id, subject, queue_key, state["built_at"])
+                 for (subject, user_id, queue_key), state in queues.items()
+                 if state is not None and state["position"] != state["flushed_position"]]
+    missing = [(user_id, subject, queue_key) for (subject, user_id, queue_key), state in queues.items()
+               if state is None]
+    if positions or missing:
+        conn = connect_game_db()
+        cursor = conn.cursor()
+        # A queue rebuilt since it was loaded starts again at 0, so its old position is dropped
+        cursor.executemany("""
+            UPDATE practice_queues
+            SET position = ?
+            WHERE user_id = ? AND subject = ? AND queue_key = ? AND built_at = ?
+        """, positions)
+        cursor.executemany("""
+            INSERT OR IGNORE INTO practice_queues (user_id, subject, queue_key)
+            VALUES (?, ?, ?)
+        """, missing)
+        conn.commit()
+        conn.close()
+    for key, state in list(queues.items()):
+        if state is None:
+            del queues[key]  # Registered; looked up again once the build has filled it
+        else:
+            state["flushed_position"] = state["position"]
+    st.session_state.practice_queue_writes = 0
+
+def pop_queued_question_id(subject, user_id, queue_key):
+    """
+    Pop the next question ID of a queue that the user has not reviewed (or that is due).
+    Returns None if the queue is missing, stale or used up. A queue is read once per
+    session; its position is kept in the session and written back every
+    QUEUE_FLUSH_SERVES serves, together with the missing queues to register.
+    """
+    queues = _session_queues()
+    key = (subject, user_id, queue_key)
+    if key not in queues:
+        queues[key] = _load_queue(subject, user_id, queue_key)
+    state = queues[key]
+    if state is None:
+        st.session_state.practice_queue_writes += 1  # Registered with the next flush
+
+    index = get_question_index(subject)
+    stale_before = (datetime.now(timezone.utc) - timedelta(hours=MAX_QUEUE_AGE_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+    question_id = None
+    if (state is not None and state["db_version"] == index["version"] and state["built_at"]
+            and state["built_at"] >= stale_before):
+        # Skip questions reviewed since the build, e.g. in another mode
+        positions = index["positions"]
+        reviewed_mask = get_reviewed_mask(subject, user_id)
+        question_ids = state["question_ids"]
+        while state["position"] < len(question_ids):
+            candidate = question_ids[state["position"]]
+            state["position"] += 1
+            if candidate in positions and (candidate in state["due_ids"]
+                                           or not reviewed_mask >> positions[candidate] & 1):
+                question_id = candidate
+                break
+        if state["position"] != state["flushed_position"]:
+            st.session_state.practice_queue_writes += 1
+
+    if st.session_state.practice_queue_writes >= QUEUE_FLUSH_SERVES:
+        flush_queue_positions()
+    return question_id
+
+def serve_question(subject, user_id, queue_key, draw_live):
+    """
+    Return the next question row from the queue, or from draw_live() when the queue
+    has nothing usable left.
+    """
+    question_id = pop_queued_question_id(subject, user_id, queue_key)
+    if question_id is not None:
+        question = fetch_question(subject, question_id)
+        if question is not None:
+            return question
+    return draw_live()
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute practice queues for active users.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Rebuild the queues of every active user.")
+    build_parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count).")
+    build_parser.add_argument("--active-days", type=int, default=ACTIVE_DAYS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    queue_count = build_all_queues(args.processes, args.active_days)
+    print(f"Built {queue_count} queues in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
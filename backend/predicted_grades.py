@@ -0,0 +1,338 @@
+"""
+Predicted IB grades from estimated marks.
+
+Each answer is worth an estimated share of the question's maximum_marks: all of them
+when correct, PARTIAL_CREDIT of them when partially correct and none when incorrect.
+Summing estimated and available marks per paper, level and syllabus topic gives
+predicted percentages, which GRADE_BOUNDARIES turn into grades. Questions worth more
+marks count for more, as they do in an exam.
+
+The totals of every user of a subject are computed in one vectorised pass over the
+progress table, so a whole class can be reported at once:
+
+    python -m backend.predicted_grades report --subject Chemistry [--csv grades.csv]
+
+Per-user totals are then cached and kept current by folding in the attempts logged
+after the pass, like the daily rollups in attempts.py.
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from backend.database import connect_game_db, get_progress_table
+from backend.question_index import get_question_index
+from backend.syllabus import get_syllabus_trie
+
+PARTIAL_CREDIT = 0.5  # Share of the marks a partially correct answer earns
+# (minimum percentage, grade), highest first; typical IB science boundaries
+GRADE_BOUNDARIES = [(70, 7), (58, 6), (46, 5), (35, 4), (24, 3), (12, 2), (0, 1)]
+MAX_CACHED_USERS = 2000  # (subject, user) totals kept in memory before LRU eviction
+TOTALS_TTL_SECONDS = 3600  # Bounds how long a progress reset in another process can go unseen
+USER_BATCH_SIZE = 1000  # Range of user IDs whose progress is read and summed at a time
+
+# Process-wide LRU cache: (subject, user_id) -> totals (see _aggregate)
+_totals = OrderedDict()
+_totals_lock = threading.Lock()
+# Process-wide cache: subject -> grouping arrays of one question-DB version (see _dimensions)
+_dimensions_cache = {}
+_dimensions_lock = threading.Lock()
+
+
+def predicted_grade(percentage):
+    for boundary, grade in GRADE_BOUNDARIES:
+        if percentage >= boundary:
+            return grade
+    return GRADE_BOUNDARIES[-1][1]
+
+# -------------------------
+# Aggregation
+# -------------------------
+def _mask_to_array(mask, length):
+    """
+    Unpack a question-index bitmap into a bool array over the index positions.
+    """
+    data = np.frombuffer(mask.to_bytes((length + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(data, bitorder="little")[:length].astype(bool)
+
+def _dimensions(subject):
+    """
+    Return the arrays that group questions for the current question-DB version:
+    maximum marks, paper and level codes per index position, and a
+    (questions x topics) membership matrix of the top-level syllabus topics.
+    """
+    index = get_question_index(subject)
+    with _dimensions_lock:
+        cached = _dimensions_cache.get(subject)
+        if cached and cached["version"] == index["version"]:
+            return cached
+
+    length = len(index["ids"])
+    dimensions = {"version": index["version"], "ids": np.asarray(index["ids"], dtype=np.int64),
+                  "marks": np.asarray(index["marks"], dtype=np.float64)}
+    for name, key in (("paper", "paper_masks"), ("level", "level_masks")):
+        labels = sorted(value for value in index[key] if value is not None)
+        codes = np.full(length, len(labels), dtype=np.int64)  # Unknown values get their own, unreported code
+        for code, label in enumerate(labels):
+            codes[_mask_to_array(index[key][label], length)] = code
+        dimensions[name] = (labels, codes)
+    topics = get_syllabus_trie(subject)["children"]
+    membership = np.zeros((length, len(topics)), dtype=bool)
+    for column, topic in enumerate(topics.values()):
+        membership[:, column] = _mask_to_array(topic["mask"], length)
+    dimensions["syllabus"] = (list(topics), membership)
+
+    with _dimensions_lock:
+        _dimensions_cache[subject] = dimensions
+    return dimensions
+
+def _aggregate(dimensions, user_ids, question_ids, correct, partial, incorrect):
+    """
+    Sum estimated and available marks per user over rows of answer counts.
+    Returns {user_id: totals}, where totals maps "overall" to [earned, available] and
+    "paper", "level" and "syllabus" to (groups x 2) arrays in the order of their labels.
+    """
+    ids = dimensions["ids"]
+    positions = np.searchsorted(ids, question_ids)
+    known = positions < len(ids)
+    known[known] = ids[positions[known]] == question_ids[known]  # Drop questions no longer in the DB
+    positions = positions[known]
+    marks = dimensions["marks"][positions]
+    earned = marks * (correct[known] + PARTIAL_CREDIT * partial[known])
+    available = marks * (correct[known] + partial[known] + incorrect[known])
+
+    users, user_rows = np.unique(user_ids[known], return_inverse=True)
+    marks_by_user = np.stack([earned, available], axis=-1)
+
+    def by_code(codes, group_count, answer_rows=slice(None)):
+        # One bincount per column over user * groups + group
+        flat = user_rows[answer_rows] * group_count + codes
+        size = len(users) * group_count
+        return np.stack([np.bincount(flat, weights=marks_by_user[answer_rows, column], minlength=size)
+                         for column in range(2)], axis=-1).reshape(len(users), group_count, 2)
+
+    grouped = {"overall": by_code(np.zeros(len(positions), dtype=np.int64), 1)[:, 0]}
+    for name in ("paper", "level"):
+        labels, codes = dimensions[name]
+        grouped[name] = by_code(codes[positions], len(labels) + 1)[:, :len(labels)]
+    # An answer counts towards every topic its question is linked to: one entry per (answer, topic)
+    labels, membership = dimensions["syllabus"]
+    answer_rows, topics = np.nonzero(membership[positions])
+    grouped["syllabus"] = by_code(topics, len(labels), answer_rows)
+
+    return {int(user_id): {name: values[row] for name, values in grouped.items()}
+            for row, user_id in enumerate(users)}
+
+def _empty_totals(dimensions):
+    return {
+        "overall": np.zeros(2),
+        "paper": np.zeros((len(dimensions["paper"][0]), 2)),
+        "level": np.zeros((len(dimensions["level"][0]), 2)),
+        "syllabus": np.zeros((len(dimensions["syllabus"][0]), 2)),
+    }
+
+def _aggregate_progress(dimensions, progress):
+    progress = progress.fillna(0)
+    return _aggregate(
+        dimensions,
+        progress["user_id"].to_numpy(dtype=np.int64),
+        progress["question_id"].to_numpy(dtype=np.int64),
+        progress["correct_count"].to_numpy(dtype=np.float64),
+        progress["partially_correct_count"].to_numpy(dtype=np.float64),
+        progress["incorrect_count"].to_numpy(dtype=np.float64),
+    )
+
+def compute_subject_totals(subject, user_id=None):
+    """
+    Compute the totals of every user of the subject (or of one user) in one pass
+    over the progress table. Returns ({user_id: totals}, last attempt ID included).
+    """
+    dimensions = _dimensions(subject)
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    # Read the progress rows and the attempts watermark from one snapshot
+    cursor.execute("BEGIN")
+    cursor.execute("SELECT MAX(id) FROM attempts")
+    watermark = cursor.fetchone()[0] or 0
+    if user_id is None:
+        # A range of user IDs at a time, so memory is bounded by one range plus the totals
+        cursor.execute(f"SELECT MAX(user_id) FROM {get_progress_table(subject)}")
+        totals = {}
+        for first in range(0, cursor.fetchone()[0] or 0, USER_BATCH_SIZE):
+            totals.update(_aggregate_progress(dimensions, pd.read_sql_query(f"""
+                SELECT user_id, question_id, correct_count, partially_correct_count, incorrect_count
+                FROM {get_progress_table(subject)}
+                WHERE user_id > ? AND user_id <= ?
+            """, conn, params=(first, first + USER_BATCH_SIZE))))
+    else:
+        totals = _aggregate_progress(dimensions, pd.read_sql_query(f"""
+            SELECT user_id, question_id, correct_count, partially_correct_count, incorrect_count
+            FROM {get_progress_table(subject)}
+            WHERE user_id = ?
+        """, conn, params=(user_id,)))
+    conn.commit()
+    conn.close()
+    return totals, watermark
+
+def _attempts_since(subject, user_id, watermark):
+    """
+    Return the user's attempts logged after the watermark as count arrays, and the new watermark.
+    """
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, question_id, status
+        FROM attempts
+        WHERE id > ? AND user_id = ? AND subject = ?
+    """, (watermark, user_id, subject))
+    rows = cursor.fetchall()
+    conn.close()
+    if not rows:
+        return None, watermark
+    statuses = np.array([row[2] for row in rows])
+    return (
+        np.full(len(rows), user_id, dtype=np.int64),
+        np.array([row[1] for row in rows], dtype=np.int64),
+        (statuses == "correct").astype(np.float64),
+        (statuses == "partially_correct").astype(np.float64),
+        (statuses == "incorrect").astype(np.float64),
+    ), max(row[0] for row in rows)
+
+# -------------------------
+# Cached per-user totals
+# -------------------------
+def _store(key, entry):
+    """
+    Must be called with _totals_lock held.
+    """
+    _totals[key] = entry
+    _totals.move_to_end(key)
+    while len(_totals) > MAX_CACHED_USERS:
+        _totals.popitem(last=False)
+
+def refresh_subject(subject):
+    """
+    Recompute and cache the totals of every user of the subject in one batch pass.
+    Returns {user_id: totals}.
+    """
+    dimensions = _dimensions(subject)
+    totals, watermark = compute_subject_totals(subject)
+    computed_at = time.monotonic()
+    with _totals_lock:
+        for user_id, user_totals in totals.items():
+            _store((subject, user_id), {"version": dimensions["version"], "watermark": watermark,
+                                        "computed_at": computed_at, **user_totals})
+    return totals
+
+def get_user_totals(subject, user_id):
+    """
+    Return the user's cached totals, first folding in attempts logged since they
+    were computed. Users without a cached entry are computed on their own.
+    """
+    dimensions = _dimensions(subject)
+    key = (subject, user_id)
+    with _totals_lock:
+        entry = _totals.get(key)
+        if (entry is not None and entry["version"] == dimensions["version"]
+                and time.monotonic() - entry["computed_at"] < TOTALS_TTL_SECONDS):
+            _totals.move_to_end(key)
+        else:
+            entry = None
+
+    if entry is None:
+        totals, watermark = compute_subject_totals(subject, user_id)
+        entry = {"version": dimensions["version"], "watermark": watermark, "computed_at": time.monotonic(),
+                 **totals.get(user_id, _empty_totals(dimensions))}
+        with _totals_lock:
+            _store(key, entry)
+        return entry
+
+    delta, watermark = _attempts_since(subject, user_id, entry["watermark"])
+    if delta is None:
+        return entry
+    delta_totals = _aggregate(dimensions, *delta).get(user_id)
+    with _totals_lock:
+        current = _totals.get(key)
+        # Another thread may have folded the same attempts in meanwhile
+        if current is entry:
+            entry = {name: entry[name] + delta_totals[name] if name in delta_totals else entry[name]
+                     for name in entry}
+            entry["watermark"] = watermark
+            _store(key, entry)
+        elif current is not None:
+            entry = current
+    return entry
+
+def discard_user(subject, user_id):
+    """
+    Forget a user's totals after progress is deleted rather than added to.
+    """
+    with _totals_lock:
+        _totals.pop((subject, user_id), None)
+
+# -------------------------
+# Reports
+# -------------------------
+def _rows(group, labels, values):
+    return [(group, label, earned, available) for label, (earned, available) in zip(labels, values) if available > 0]
+
+def _report_frame(rows):
+    # Numeric columns even without rows, e.g. for a user who has not answered anything yet
+    frame = pd.DataFrame(rows, columns=["Group", "Name", "Estimated Marks", "Available Marks"]).astype(
+        {"Estimated Marks": np.float64, "Available Marks": np.float64})
+    frame["Predicted %"] = (100 * frame["Estimated Marks"] / frame["Available Marks"]).round(1)
+    frame["Predicted Grade"] = frame["Predicted %"].map(predicted_grade)
+    return frame
+
+def get_predicted_grades(subject, user_id):
+    """
+    Return the user's predicted percentage and grade overall and per paper, level and
+    syllabus topic as a DataFrame, leaving out groups with no answers.
+    """
+    dimensions = _dimensions(subject)
+    totals = get_user_totals(subject, user_id)
+    rows = _rows("Overall", ["All questions"], [totals["overall"]])
+    for name, group in (("paper", "Paper"), ("level", "Level"), ("syllabus", "Syllabus")):
+        rows += _rows(group, dimensions[name][0], totals[name])
+    return _report_frame(rows)
+
+def predict_subject_grades(subject):
+    """
+    Return one row per user with their overall and per-paper predicted percentages
+    and overall grade, from one batch pass over the subject.
+    """
+    dimensions = _dimensions(subject)
+    papers = dimensions["paper"][0]
+    records = []
+    for user_id, totals in sorted(refresh_subject(subject).items()):
+        earned, available = totals["overall"]
+        if available <= 0:
+            continue
+        record = {"user_id": user_id, "Predicted %": round(100 * earned / available, 1)}
+        record["Predicted Grade"] = predicted_grade(record["Predicted %"])
+        for paper, (paper_earned, paper_available) in zip(papers, totals["paper"]):
+            record[f"Paper {paper} %"] = round(100 * paper_earned / paper_available, 1) if paper_available else None
+        records.append(record)
+    return pd.DataFrame(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict IB grades for every user of a subject.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Print or export the predicted grades of all users.")
+    report_parser.add_argument("--subject", choices=["Chemistry", "Physics"], default="Chemistry")
+    report_parser.add_argument("--csv", help="Write the report to this CSV file instead of printing it.")
+    args = parser.parse_args()
+
+    grades = predict_subject_grades(args.subject)
+    if args.csv:
+        grades.to_csv(args.csv, index=False)
+        print(f"Wrote predicted grades of {len(grades)} users to {args.csv}")
+    else:
+        print(grades.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Operator-only profiling panel.
+
+Set PROFILING_OPERATORS to a comma-separated list of usernames to enable it:
+
+    PROFILING_OPERATORS=alice,bob streamlit run streamlit_app.py
+
+Reruns of those users' sessions are profiled with cProfile, a stack sampler and
+tracemalloc, and a panel below the page shows the top allocators, the largest
+st.session_state entries and the slowest backend calls of the session. The sampled
+stacks can be downloaded in collapsed format for flame graph tools. Other sessions,
+and every session when the variable is unset, only pay for one set lookup per rerun.
+tracemalloc is process-wide, so it only runs while a profiled rerun is in progress and
+slows the worker's other sessions down for that long.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import pandas as pd
+import streamlit as st
+
+from backend.session_state import session_memory_usage
+
+PROFILING_OPERATORS = {name.strip() for name in os.environ.get("PROFILING_OPERATORS", "").split(",") if name.strip()}
+SAMPLE_INTERVAL_SECONDS = 0.005  # Time between stack samples of the script thread
+TRACEMALLOC_FRAMES = 10  # Frames kept per traced allocation
+MAX_STACKS = 5000  # Distinct collapsed stacks kept per session
+TOP_ENTRIES = 15  # Rows shown per table in the panel
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# cProfile can only profile one thread at a time; reruns of other operator sessions
+# that overlap skip the call profile instead of waiting
+_profiler_lock = threading.Lock()
+# tracemalloc runs while any profiled rerun does; it is stopped when the last one ends
+_traced_reruns = 0
+_started_tracing = False  # Whether tracemalloc was started here, not e.g. by PYTHONTRACEMALLOC
+_tracing_lock = threading.Lock()
+
+
+def run_profiled(main):
+    """
+    Run the app's main(), profiling it when the logged-in user is an operator.
+    """
+    if not PROFILING_OPERATORS or st.session_state.get("username") not in PROFILING_OPERATORS:
+        return main()
+
+    _start_tracing()
+    stacks = Counter()
+    sampler_done = threading.Event()
+    sampler = threading.Thread(target=_sample_stacks, args=(threading.get_ident(), stacks, sampler_done), daemon=True)
+    profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+
+    start = time.perf_counter()
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        main()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        sampler_done.set()
+        sampler.join()
+        seconds = time.perf_counter() - start
+        # Always keep what was collected, even when main() ended with st.rerun()
+        _record_rerun(seconds, profiler, stacks, _stop_tracing())
+    show_profiling_panel()
+
+# -------------------------
+# Collection
+# -------------------------
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _sample_stacks(thread_id, stacks, done):
+    """
+    Count the collapsed stacks of the script thread until done is set.
+    """
+    while not done.wait(SAMPLE_INTERVAL_SECONDS):
+        frame = sys._current_frames().get(thread_id)
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        if labels:
+            stacks[";".join(reversed(labels))] += 1
+
+def _start_tracing():
+    global _traced_reruns, _started_tracing
+    with _tracing_lock:
+        if _traced_reruns == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _started_tracing = True
+        _traced_reruns += 1
+
+def _stop_tracing():
+    """
+    Take the rerun's allocation statistics, then stop tracemalloc if no other profiled
+    rerun still needs it. Returns (top allocators, traced bytes, peak traced bytes).
+    """
+    global _traced_reruns, _started_tracing
+    allocators = _top_allocators()
+    current, peak = tracemalloc.get_traced_memory()
+    with _tracing_lock:
+        _traced_reruns -= 1
+        if _traced_reruns == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+    return allocators, current, peak
+
+def _record_rerun(seconds, profiler, stacks, allocations):
+    """
+    Fold one rerun's measurements into the session's running totals.
+    """
+    profile = st.session_state.setdefault("profiling", {"reruns": 0, "seconds": 0.0, "calls": {}, "stacks": Counter()})
+    profile["reruns"] += 1
+    profile["seconds"] += seconds
+    profile["last_seconds"] = seconds
+    profile["allocators"], profile["traced_bytes"], profile["peak_traced_bytes"] = allocations
+
+    for stack, count in stacks.items():
+        if stack in profile["stacks"] or len(profile["stacks"]) < MAX_STACKS:
+            profile["stacks"][stack] += count
+
+    if profiler is not None:
+        # Only calls into backend modules: (file, line, function) -> [calls, own seconds, cumulative seconds]
+        for (filename, line, function), (_, calls, own, cumulative, _) in pstats.Stats(profiler).stats.items():
+            if not filename.startswith(BACKEND_DIR):
+                continue
+            totals = profile["calls"].setdefault(f"{os.path.basename(filename)}:{line} {function}", [0, 0.0, 0.0])
+            totals[0] += calls
+            totals[1] += own
+            totals[2] += cumulative
+
+def _top_allocators():
+    """
+    Return the lines holding the most memory allocated since tracing started,
+    i.e. during the rerun, as (location, bytes, blocks).
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    return [(str(stat.traceback[0]), stat.size, stat.count)
+            for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]]
+
+# -------------------------
+# Panel
+# -------------------------
+def show_profiling_panel():
+    profile = st.session_state["profiling"]
+    with st.expander("Profiling"):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Last Rerun", f"{profile['last_seconds'] * 1000:.0f} ms")
+        col2.metric("Mean Rerun", f"{profile['seconds'] / profile['reruns'] * 1000:.0f} ms")
+        col3.metric("Traced Memory", f"{profile['traced_bytes'] / 2**20:.1f} MB",
+                    f"peak {profile['peak_traced_bytes'] / 2**20:.1f} MB", delta_color="off")
+
+        st.write("**Top allocators** (memory allocated during the last rerun and still held at its end)")
+        st.dataframe(pd.DataFrame(
+            [(location, size / 1024, count) for location, size, count in profile["allocators"]],
+            columns=["Location", "KB", "Blocks"],
+        ), hide_index=True)
+
+        session_bytes, entries = session_memory_usage()
+        st.write(f"**Largest session_state entries** ({session_bytes / 1024:.1f} KB in total)")
+        st.dataframe(pd.DataFrame(
+            [(key, size / 1024) for key, size in entries[:TOP_ENTRIES]],
+            columns=["Key", "KB"],
+        ), hide_index=True)
+
+        st.write(f"**Slowest backend calls** (over {profile['reruns']} reruns of this session)")
+        slowest = sorted(profile["calls"].items(), key=lambda item: item[1][2], reverse=True)[:TOP_ENTRIES]
+        st.dataframe(pd.DataFrame(
+            [(function, calls, own * 1000, cumulative * 1000) for function, (calls, own, cumulative) in slowest],
+            columns=["Function", "Calls", "Own ms", "Cumulative ms"],
+        ), hide_index=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "Download collapsed stacks",
+                "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items()),
+                file_name="stacks.folded",
+            )
+        with col2:
+            if st.button("Reset profile"):
+                del st.session_state["profiling"]
+                st.rerun()
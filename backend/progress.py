@@ -1,4 +1,17 @@
-from backend.database import connect_game_db, get_db_connection
+from backend.database import connect_game_db, get_progress_table
+from backend.question_index import get_question_index, should_exclude_question
+from backend.attempts import record_attempts
+from backend import cache, predicted_grades, reviewed_cache, weighted_sampling
+
+PROGRESS_TTL_SECONDS = 300  # Bounds how long writes made by other processes can go unseen
+RECENT_PROGRESS_LIMIT = 30  # Questions listed in the History mode
+
+# Progress column incremented for each answer status
+STATUS_COUNT_COLUMNS = {
+    "correct": "correct_count",
+    "partially_correct": "partially_correct_count",
+    "incorrect": "incorrect_count",
+}
 
 def mark_as_lacking_context(subject, question_id, user_id):
     """
@@ -17,7 +30,7 @@ def mark_as_lacking_context(subject, question_id, user_id):
                 updated_at
             )
             VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-            ON CONFLICT(question_id)
+            ON CONFLICT(user_id, question_id)
             DO UPDATE
             SET
                 user_id = excluded.user_id,
@@ -35,7 +48,7 @@ def mark_as_lacking_context(subject, question_id, user_id):
                 updated_at
             )
             VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-            ON CONFLICT(question_id)
+            ON CONFLICT(user_id, question_id)
             DO UPDATE
             SET
                 user_id = excluded.user_id,
@@ -46,6 +59,9 @@ def mark_as_lacking_context(subject, question_id, user_id):
 
     conn.commit()
     conn.close()
+    reviewed_cache.mark_reviewed(subject, user_id, question_id, lacking_context=True)
+    weighted_sampling.note_answered(subject, user_id, question_id)
+    cache.invalidate(subject, user_id)
 
 def reset_progress(subject, user_id):
     """
@@ -62,189 +78,143 @@ def reset_progress(subject, user_id):
 
     conn.commit()
     conn.close()
+    reviewed_cache.clear_reviewed(subject, user_id)
+    weighted_sampling.discard_table(subject, user_id)
+    predicted_grades.discard_user(subject, user_id)
+    cache.invalidate(subject, user_id)
 
-def update_progress(subject, question_id, status, user_id):
+def update_progress(subject, question_id, status, user_id, seconds_spent=None):
     """
     Update the progress for a question based on the status.
     Status can be "correct", "partially_correct", or "incorrect".
+    The answer is also appended to the attempts log, with the seconds spent on it if known.
     """
-    conn = connect_game_db()
-    cursor = conn.cursor()
+    update_progress_batch(subject, {question_id: status}, user_id, seconds_spent)
 
-    if status == "correct":
-        if subject == "Chemistry":
-            cursor.execute("""
-                INSERT INTO user_progress_chemistry (
-                    question_id,
-                    user_id,
-                    lacking_context,
-                    reviewed,
-                    updated_at
-                )
-                VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-                ON CONFLICT(question_id)
-                DO UPDATE
-                SET
-                    user_id = excluded.user_id,
-                    lacking_context = 1,
-                    reviewed = 1,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (question_id, user_id))
-        else:
-            cursor.execute("""
-                            INSERT INTO user_progress_physics (
-                                question_id,
-                                user_id,
-                                lacking_context,
-                                reviewed,
-                                updated_at
-                            )
-                            VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-                            ON CONFLICT(question_id)
-                            DO UPDATE
-                            SET
-                                user_id = excluded.user_id,
-                                lacking_context = 1,
-                                reviewed = 1,
-                                updated_at = CURRENT_TIMESTAMP
-                        """, (question_id, user_id))
-    elif status == "partially_correct":
-        if subject == "Chemistry":
-            cursor.execute("""
-                INSERT INTO user_progress_chemistry (
-                    question_id,
-                    user_id,
-                    lacking_context,
-                    reviewed,
-                    updated_at
-                )
-                VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-                ON CONFLICT(question_id)
-                DO UPDATE
-                SET
-                    user_id = excluded.user_id,
-                    lacking_context = 1,
-                    reviewed = 1,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (question_id, user_id))
-        else:
-            cursor.execute("""
-                            INSERT INTO user_progress_physics (
-                                question_id,
-                                user_id,
-                                lacking_context,
-                                reviewed,
-                                updated_at
-                            )
-                            VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-                            ON CONFLICT(question_id)
-                            DO UPDATE
-                            SET
-                                user_id = excluded.user_id,
-                                lacking_context = 1,
-                                reviewed = 1,
-                                updated_at = CURRENT_TIMESTAMP
-                        """, (question_id, user_id))
-    elif status == "incorrect":
-        if subject == "Chemistry":
-            cursor.execute("""
-                INSERT INTO user_progress_chemistry (
-                    question_id,
-                    user_id,
-                    lacking_context,
-                    reviewed,
-                    updated_at
-                )
-                VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-                ON CONFLICT(question_id)
-                DO UPDATE
-                SET
-                    user_id = excluded.user_id,
-                    lacking_context = 1,
-                    reviewed = 1,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (question_id, user_id))
-        else:
-            cursor.execute("""
-                INSERT INTO user_progress_physics (
-                    question_id,
-                    user_id,
-                    lacking_context,
-                    reviewed,
-                    updated_at
-                )
-                VALUES (?, ?, 1, 1, CURRENT_TIMESTAMP)
-                ON CONFLICT(question_id)
-                DO UPDATE
-                SET
-                    user_id = excluded.user_id,
-                    lacking_context = 1,
-                    reviewed = 1,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (question_id, user_id))
+def update_progress_batch(subject, results, user_id, seconds_spent=None):
+    """
+    Record the outcome of several questions at once, e.g. a submitted mock paper.
+    results maps question_id -> status ("correct", "partially_correct" or "incorrect");
+    seconds_spent, if given, is the time spent on each question.
+    All rows and their attempts are written in a single transaction.
+    """
+    results = {question_id: status for question_id, status in results.items() if status in STATUS_COUNT_COLUMNS}
+    if not results:
+        return
 
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    for status, count_column in STATUS_COUNT_COLUMNS.items():
+        rows = [(question_id, user_id) for question_id, question_status in results.items()
+                if question_status == status]
+        if not rows:
+            continue
+        cursor.executemany(f"""
+            INSERT INTO {get_progress_table(subject)} (
+                question_id,
+                user_id,
+                {count_column},
+                lacking_context,
+                reviewed,
+                updated_at
+            )
+            VALUES (?, ?, 1, 0, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id, question_id)
+            DO UPDATE
+            SET
+                {count_column} = {count_column} + 1,
+                lacking_context = 0,
+                reviewed = 1,
+                updated_at = CURRENT_TIMESTAMP
+        """, rows)
+    record_attempts(cursor, subject, user_id,
+                    [(question_id, status, seconds_spent) for question_id, status in results.items()])
     conn.commit()
     conn.close()
 
+    for question_id in results:
+        reviewed_cache.mark_reviewed(subject, user_id, question_id, lacking_context=False)
+        weighted_sampling.note_answered(subject, user_id, question_id)
+    cache.invalidate(subject, user_id)
+
 def get_progress(subject, user_id):
     """
     Get the total number of questions and the number of reviewed questions.
     Exclude questions marked as 'lacking context' or invalid multipart questions.
     """
-    conn = get_db_connection(subject) # Connect to ChemQuestionsDatabase
-    game_conn = connect_game_db()  # Connect to Game Database
-    cursor = conn.cursor()
-    game_cursor = game_conn.cursor()
+    index = get_question_index(subject)
 
-    # Fetch all questions and filter them in Python
-    cursor.execute("SELECT id, reference_code, paper FROM questions")
-    questions = cursor.fetchall()
+    def load():
+        # Valid questions are precomputed once per question database
+        total_questions = index["valid_mask"].bit_count()
 
-    # Filter out questions to exclude
-    valid_questions = [
-        q for q in questions if not should_exclude_question(q[1], q[2])
-    ]
-    total_questions = len(valid_questions)
+        # Reviewed questions come from the cached bitmaps instead of the game's database,
+        # counted over the same valid questions so answers to excluded ones cannot exceed the total
+        reviewed_questions = reviewed_cache.count_reviewed(subject, user_id, index["valid_mask"])
 
-    # Reviewed questions from the game's database
-    if subject == "Chemistry":
-        game_cursor.execute("SELECT COUNT(*) FROM user_progress_chemistry WHERE reviewed = 1 AND lacking_context = 0 AND user_id = ?", (user_id,))
-    else:
-        game_cursor.execute("SELECT COUNT(*) FROM user_progress_physics WHERE reviewed = 1 AND lacking_context = 0 AND user_id = ?", (user_id,))
-    reviewed_questions = game_cursor.fetchone()[0]
-
-    conn.close()
-    game_conn.close()
+        return reviewed_questions, total_questions
 
-    return reviewed_questions, total_questions
+    return cache.get_or_load("progress", (subject, user_id), None, load,
+                             ttl=PROGRESS_TTL_SECONDS, source_version=index["version"])
 
-def should_exclude_question(reference_code, paper):
+def get_answer_totals(subject, user_id):
     """
-    Determine if a question should be excluded based on its reference_code and paper type.
-
-    - Exclude questions if the part after the last full stop in the reference_code is not numeric.
-    - Do not exclude Paper 1B questions.
+    Get the user's total number of correct, partially correct and incorrect answers.
     """
-    if paper == "1B":  # Always include Paper 1B questions
-        return False
-
-    # Extract the part after the last full stop
-    last_part = reference_code.split(".")[-1]
-
-    # Exclude if the last part is not numeric
-    return not last_part.isdigit()
-
-def remove_question_from_progress(question_id, user_id):
+    def load():
+        conn = connect_game_db()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT SUM(correct_count), SUM(partially_correct_count), SUM(incorrect_count)
+            FROM {get_progress_table(subject)}
+            WHERE user_id = ?
+        """, (user_id,))
+        totals = tuple(total or 0 for total in cursor.fetchone())
+        conn.close()
+        return totals
+
+    return cache.get_or_load("answer_totals", (subject, user_id), None, load, ttl=PROGRESS_TTL_SECONDS)
+
+def get_recent_progress(subject, user_id):
+    """
+    Get the progress rows of the user's most recently answered questions, newest first:
+    (question_id, correct_count, partially_correct_count, incorrect_count, updated_at).
+    """
+    def load():
+        conn = connect_game_db()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT question_id,
+                   correct_count,
+                   partially_correct_count,
+                   incorrect_count,
+                   updated_at
+            FROM {get_progress_table(subject)}
+            WHERE user_id = ? AND reviewed = 1
+            ORDER BY updated_at DESC
+            LIMIT ?
+        """, (user_id, RECENT_PROGRESS_LIMIT))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    return cache.get_or_load("recent_progress", (subject, user_id), None, load, ttl=PROGRESS_TTL_SECONDS)
+
+def remove_question_from_progress(subject, question_id, user_id):
     """
     Permanently remove this question's progress for the given user,
     so it can appear again in other modes, etc.
     """
     conn = connect_game_db()
     cursor = conn.cursor()
-    cursor.execute("""
-        DELETE FROM user_progress_chemistry
+    cursor.execute(f"""
+        DELETE FROM {get_progress_table(subject)}
         WHERE question_id = ?
           AND user_id = ?
     """, (question_id, user_id))
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+    reviewed_cache.unmark_reviewed(subject, user_id, question_id)
+    weighted_sampling.discard_table(subject, user_id)
+    predicted_grades.discard_user(subject, user_id)
+    cache.invalidate(subject, user_id)
\ No newline at end of file
@@ -0,0 +1,371 @@
+"""
+Query-plan doctor: finds every SQL statement in backend/*.py and streamlit_app.py
+and explains it against the question, game and similar-question DBs.
+
+    python -m backend.query_doctor [--synthetic] [--analyze] [--update-baseline]
+
+Statements are read from the source with ast, so queries built in branches and
+f-strings over the progress tables are covered too. Each one is run through
+EXPLAIN QUERY PLAN and reported with its full table scans, temporary B-trees,
+automatic indexes and leading-wildcard LIKE or ORDER BY RANDOM() patterns, plus the
+index that would serve its equality filters. Findings are compared with
+query_plan_baseline.json; any new one is a regression and the exit code is 1.
+
+--synthetic explains against empty DBs built from the app's schema instead of the
+real files. --analyze first runs PRAGMA optimize (ANALYZE where statistics are
+missing or stale) on each DB and reports what it did and the statistics it left.
+Only the game DB is analyzed in place; the question and similar-question DBs are
+analyzed and explained as scratch copies, since writing sqlite_stat1 into them
+would change the file version that caches, the syllabus trie and the sidecar key on.
+"""
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+from backend.database import GAME_DB_PATH, create_game_database, get_db_path
+from backend.similar_questions import SIMILAR_SCHEMA, sidecar_path
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(PROJECT_DIR, "query_plan_baseline.json")
+SOURCE_PATTERNS = ("backend/*.py", "streamlit_app.py")
+
+SQL_CALLS = {"execute", "executemany", "read_sql_query", "read_sql"}
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+# Values used for f-string fields when a statement is explained
+SUBSTITUTIONS = {
+    "get_progress_table(subject)": "user_progress_chemistry",
+    "count_column": "correct_count",
+    "placeholders": "?",
+}
+
+# Schema of the question DBs, used when they are missing or --synthetic is given
+QUESTIONS_SCHEMA = """
+    CREATE TABLE questions (
+        id INTEGER PRIMARY KEY,
+        html TEXT,
+        paper TEXT,
+        reference_code TEXT,
+        syllabus_link TEXT,
+        maximum_marks TEXT,
+        level TEXT,
+        markscheme_html TEXT,
+        examiner_report_html TEXT
+    )
+"""
+
+
+# -------------------------
+# Finding statements
+# -------------------------
+def _render(node, scope):
+    """
+    Return the SQL strings a call argument can hold, or None if it is built dynamically.
+    Names are resolved through string assignments in the enclosing function.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif ast.unparse(value.value) in SUBSTITUTIONS:
+                parts.append(SUBSTITUTIONS[ast.unparse(value.value)])
+            else:
+                return None
+        return ["".join(parts)]
+    if isinstance(node, ast.Name) and scope is not None:
+        statements = []
+        for child in ast.walk(scope):
+            if (isinstance(child, ast.Assign)
+                    and any(isinstance(target, ast.Name) and target.id == node.id for target in child.targets)):
+                statements.extend(_render(child.value, None) or [])
+        return statements or None
+    return None
+
+def find_statements(project_dir=PROJECT_DIR):
+    """
+    Return every SQL statement issued through execute/executemany/read_sql_query as
+    dicts with file, function, line and sql (None when it is built dynamically).
+    """
+    statements = []
+    paths = sorted(path for pattern in SOURCE_PATTERNS for path in glob.glob(os.path.join(project_dir, pattern)))
+    for path in paths:
+        if os.path.abspath(path) == os.path.abspath(__file__):
+            continue  # This module's own catalogue and PRAGMA queries
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        functions = [node for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, "id", None)
+            if name not in SQL_CALLS:
+                continue
+            # Functions containing the call, outermost first, e.g. get_recent_progress.load
+            enclosing = sorted((function for function in functions
+                                if function.lineno <= node.lineno <= function.end_lineno),
+                               key=lambda function: function.lineno)
+            scope = enclosing[-1] if enclosing else None
+            for sql in _render(node.args[0], scope) or [None]:
+                if sql is not None and not sql.strip().upper().startswith(EXPLAINABLE):
+                    continue
+                statements.append({
+                    "file": os.path.relpath(path, project_dir),
+                    "function": ".".join(function.name for function in enclosing) or "<module>",
+                    "line": node.lineno,
+                    "sql": " ".join(sql.split()) if sql else None,
+                })
+    return statements
+
+def statement_key(statement):
+    """
+    Identify a statement by file, function and SQL text, so baselines survive line moves.
+    """
+    digest = hashlib.sha1((statement["sql"] or "").encode()).hexdigest()[:10]
+    return f"{statement['file']}:{statement['function']}:{digest}"
+
+# -------------------------
+# Databases
+# -------------------------
+def _scratch_copy(path, scratch_dir):
+    """
+    Copy a DB into the scratch directory with the backup API and return a connection to the copy.
+    """
+    source = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    conn = sqlite3.connect(os.path.join(scratch_dir, os.path.basename(path)))
+    source.backup(conn)
+    source.close()
+    return conn
+
+def open_databases(synthetic=False, analyze=False):
+    """
+    Return {name: connection} for the question, game and similar-question DBs. Real files are opened
+    read-only; with analyze the game DB is opened read-write and the others are replaced by
+    scratch copies, so statistics are never written into them. Missing DBs (or all with
+    synthetic) are replaced by empty copies of the schema.
+    """
+    scratch_dir = tempfile.mkdtemp(prefix="query_doctor_")
+    connections = {}
+    databases = (
+        ("questions", get_db_path("Chemistry")),
+        ("physics questions", get_db_path("Physics")),
+        ("game", GAME_DB_PATH),
+        ("similar", sidecar_path("Chemistry")),
+    )
+    for name, path in databases:
+        if not synthetic and os.path.exists(path):
+            if analyze and name != "game":
+                connections[name] = _scratch_copy(path, scratch_dir)
+            else:
+                mode = "rw" if analyze else "ro"
+                connections[name] = sqlite3.connect(f"file:{os.path.abspath(path)}?mode={mode}", uri=True)
+        elif name == "game":
+            scratch_path = os.path.join(scratch_dir, "questions_game.db")
+            create_game_database(scratch_path)
+            connections[name] = sqlite3.connect(scratch_path)
+        elif name == "questions":
+            connections[name] = sqlite3.connect(":memory:")
+            connections[name].execute(QUESTIONS_SCHEMA)
+        elif name == "similar":
+            connections[name] = sqlite3.connect(":memory:")
+            connections[name].executescript(SIMILAR_SCHEMA)
+    return connections
+
+def optimize_database(conn):
+    """
+    Gather planner statistics: a full ANALYZE if the DB has none yet, otherwise
+    PRAGMA optimize, which re-analyzes the tables this connection queried whose
+    statistics are missing or stale.
+    Returns (seconds, [actions], [(table, index, stat)]).
+    """
+    start = time.perf_counter()
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    if has_stats:
+        # Mask 0x03 lists the ANALYZE statements optimize would run without running them
+        actions = [row[0] for row in conn.execute("PRAGMA optimize(0x03)").fetchall()]
+        conn.execute("PRAGMA optimize")
+    else:
+        actions = ["ANALYZE"]
+        conn.execute("ANALYZE")
+    conn.commit()
+    seconds = time.perf_counter() - start
+    try:
+        stats = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1 ORDER BY tbl, idx").fetchall()
+    except sqlite3.OperationalError:  # ANALYZE found no tables with rows
+        stats = []
+    return seconds, actions, stats
+
+# -------------------------
+# Explaining
+# -------------------------
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _leading_index_columns(conn, table):
+    """
+    Return {first column: index name} for the table's indexes, including primary keys.
+    """
+    leading = {}
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        columns = conn.execute(f"PRAGMA index_info({index[1]})").fetchall()
+        if columns:
+            leading.setdefault(columns[0][2], index[1])
+    return leading
+
+def _suggest_index(conn, sql, table):
+    """
+    Suggest an index over the columns a scanned table is filtered on, or point out
+    the existing index the planner passed over.
+    """
+    columns = _table_columns(conn, table)
+    where = re.split(r"\bWHERE\b", sql, maxsplit=1, flags=re.IGNORECASE)
+    if len(where) < 2:
+        return None
+    filtered = []
+    for column in re.findall(r"(?:\w+\.)?(\w+)\s*(?:=|>=|<=|>|<|\bIN\b)\s*[?(]", where[1], flags=re.IGNORECASE):
+        if column in columns and column not in filtered:
+            filtered.append(column)
+    if not filtered:
+        return None
+    leading = _leading_index_columns(conn, table)
+    for column in filtered:
+        if column in leading:
+            return f"index {leading[column]} covers {column}, but the planner chose a scan (check statistics)"
+    return f"CREATE INDEX idx_{table}_{'_'.join(filtered)} ON {table} ({', '.join(filtered)})"
+
+def explain(connections, statement):
+    """
+    Explain a statement on the first DB that has its tables.
+    Returns (db name, plan details, findings, suggested indexes); the db name is None
+    when no DB could explain it.
+    """
+    sql = statement["sql"]
+    for name, conn in connections.items():
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count("?")).fetchall()
+        except sqlite3.Error:
+            continue
+
+        details = [row[3] for row in plan]
+        findings = []
+        suggestions = []
+        for detail in details:
+            scan = re.match(r"SCAN (\w+)", detail)
+            if scan and "INDEX" not in detail:
+                findings.append(f"full scan of {scan.group(1)}")
+                suggestion = _suggest_index(conn, sql, scan.group(1))
+                if suggestion:
+                    suggestions.append(suggestion)
+            if "TEMP B-TREE" in detail:
+                findings.append(detail.lower().replace("use temp b-tree", "temp B-tree"))
+            if "AUTOMATIC" in detail:
+                findings.append(f"automatic index: {detail}")
+        if re.search(r"LIKE\s+'%", sql, flags=re.IGNORECASE):
+            findings.append("LIKE with a leading wildcard")
+        if re.search(r"ORDER\s+BY\s+RANDOM\(\)", sql, flags=re.IGNORECASE):
+            findings.append("ORDER BY RANDOM()")
+        return name, details, sorted(set(findings)), suggestions
+    return None, [], [], []
+
+def _explain_all(connections, statements):
+    return [(statement, *explain(connections, statement)) if statement["sql"] else (statement, None, [], [], [])
+            for statement in statements]
+
+def run(synthetic=False, analyze=False):
+    """
+    Explain every statement. Returns (report rows, {db name: optimize result}).
+    With analyze, statistics are gathered after a first pass, so PRAGMA optimize
+    sees which tables the statements use, and the statements are explained again.
+    """
+    connections = open_databases(synthetic, analyze)
+    physics = connections.pop("physics questions", None)  # Same schema as the chemistry DB
+    statements = find_statements()
+    report = _explain_all(connections, statements)
+
+    optimized = {}
+    if analyze:
+        for name, conn in list(connections.items()) + ([("physics questions", physics)] if physics else []):
+            optimized[name] = optimize_database(conn)
+        report = _explain_all(connections, statements)
+
+    for conn in list(connections.values()) + ([physics] if physics else []):
+        conn.close()
+    return report, optimized
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain every backend SQL statement and flag full scans.")
+    parser.add_argument("--synthetic", action="store_true", help="Explain against empty DBs built from the schema.")
+    parser.add_argument("--analyze", action="store_true", help="Run PRAGMA optimize first and report statistics.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Accept the current findings as the baseline.")
+    parser.add_argument("--verbose", action="store_true", help="Print the plan of every statement.")
+    args = parser.parse_args()
+
+    report, optimized = run(args.synthetic, args.analyze)
+    for name, (seconds, actions, stats) in optimized.items():
+        print(f"PRAGMA optimize on {name} DB: {seconds * 1000:.0f} ms, {len(actions)} actions")
+        for action in actions:
+            print(f"    {action}")
+        for table, index, stat in stats:
+            print(f"    stat1 {table} {index or '-'}: {stat}")
+
+    baseline = load_baseline(args.baseline)
+    current = {}
+    regressions = 0
+    for statement, db_name, details, findings, suggestions in report:
+        location = f"{statement['file']}:{statement['line']} {statement['function']}"
+        if statement["sql"] is None:
+            print(f"SKIP  {location}: SQL is built dynamically")
+            continue
+        if db_name is None:
+            print(f"ERROR {location}: no database could explain: {statement['sql'][:80]}")
+            regressions += 1
+            continue
+
+        key = statement_key(statement)
+        current[key] = findings
+        new_findings = [finding for finding in findings if finding not in baseline.get(key, [])]
+        regressions += bool(new_findings)
+        status = "NEW" if new_findings else ("WARN" if findings else "OK")
+        if findings or args.verbose:
+            print(f"{status:<5} {location} [{db_name}]: {statement['sql'][:100]}")
+            for finding in findings:
+                print(f"    {'+ ' if finding in new_findings else ''}{finding}")
+            for suggestion in suggestions:
+                print(f"    suggest: {suggestion}")
+            if args.verbose:
+                for detail in details:
+                    print(f"    plan: {detail}")
+
+    explained = sum(1 for row in report if row[1])
+    flagged = sum(1 for findings in current.values() if findings)
+    print(f"\n{explained} statements explained, {flagged} with findings, {regressions} regressions")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
-from backend.database import connect_game_db, get_db_connection
-from backend.progress import should_exclude_question
+from backend import cache
+from backend.database import get_db_connection, get_db_version
+from backend.question_index import get_question_index, pick_random_id
+from backend.reviewed_cache import get_reviewed_mask
+from backend.syllabus import get_syllabus_trie, find_syllabus_node
 
 def fetch_question_by_id_chem(subject, question_id):
     """
@@ -17,99 +20,76 @@ def fetch_question_by_id_chem(subject, question_id):
     conn.close()
     return row  # e.g., (html, markscheme, examiner_report)
 
-def get_random_question(subject, user_id):
-    chem_conn = get_db_connection(subject)
-    game_conn = connect_game_db()
-    chem_cursor = chem_conn.cursor()
-    game_cursor = game_conn.cursor()
-
-    # Fetch reviewed IDs for *this subject*
-
-    if subject == "Chemistry":
-        game_cursor.execute("""
-               SELECT question_id FROM user_progress_chemistry
-               WHERE reviewed = 1 AND user_id = ?
-           """, (user_id,))
-    else:
-        game_cursor.execute("""
-              SELECT question_id FROM user_progress_physics
-              WHERE reviewed = 1 AND user_id = ?
-          """, (user_id,))
-    reviewed_ids = [row[0] for row in game_cursor.fetchall()]
-
-    if reviewed_ids:
-        placeholders = ",".join("?" for _ in reviewed_ids)
-        query = f"""
-            SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
-            FROM questions
-            WHERE id NOT IN ({placeholders})
-            ORDER BY RANDOM()
-            LIMIT 1
-        """
-        chem_cursor.execute(query, reviewed_ids)
-    else:
-        query = """
-            SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
-            FROM questions
-            ORDER BY RANDOM()
-            LIMIT 1
-        """
-        chem_cursor.execute(query)
-
-    question = chem_cursor.fetchone()
-
-    chem_conn.close()
-    game_conn.close()
-    return question
-
-def get_random_question_by_paper(subject, paper, user_id):
+def _load_question(subject, question_id):
     conn = get_db_connection(subject)
-    game_conn = connect_game_db()
     c = conn.cursor()
-    g = game_conn.cursor()
+    c.execute("""
+        SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
+        FROM questions
+        WHERE id = ?
+    """, (question_id,))
+    row = c.fetchone()
+    conn.close()
+    return row
 
-    if subject == "Chemistry":
-        g.execute("""
-            SELECT question_id FROM user_progress_chemistry
-            WHERE reviewed = 1 AND user_id = ?
-        """, (user_id,))
-    else:
-        g.execute("""
-           SELECT question_id FROM user_progress_physics
-           WHERE reviewed = 1 AND user_id = ?
-       """, (user_id,))
-    reviewed_ids = [row[0] for row in g.fetchall()]
+def fetch_question(subject, question_id):
+    """
+    Returns the full question row for a single question ID, or None if not found.
+    Rows are cached per question-DB version and shared by all sessions. The version
+    is part of the key, so sessions on the previous and the current version share the cache.
+    """
+    return cache.get_or_load("question", (subject, None), (get_db_version(subject), question_id),
+                             lambda: _load_question(subject, question_id))
 
-    if reviewed_ids:
-        placeholders = ",".join("?" for _ in reviewed_ids)
-        query = f"""
-            SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
-            FROM questions
-            WHERE paper = ?
-              AND id NOT IN ({placeholders})
-            ORDER BY RANDOM()
-            LIMIT 1
-        """
-        c.execute(query, [paper, *reviewed_ids])
-    else:
-        query = """
+def fetch_questions(subject, question_ids):
+    """
+    Returns the full question rows for several question IDs in one query,
+    in the order of question_ids. IDs that are not found are skipped.
+    Cached rows are reused and only the missing ones are read.
+    """
+    version = get_db_version(subject)
+    rows = {}
+    for question_id in question_ids:
+        row = cache.get("question", (subject, None), (version, question_id))
+        if row is not None:
+            rows[question_id] = row
+    missing = [question_id for question_id in question_ids if question_id not in rows]
+    if missing:
+        conn = get_db_connection(subject)
+        c = conn.cursor()
+        placeholders = ",".join("?" for _ in missing)
+        c.execute(f"""
             SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
             FROM questions
-            WHERE paper = ?
-            ORDER BY RANDOM()
-            LIMIT 1
-        """
-        c.execute(query, [paper])
-
-    question = c.fetchone()
-    conn.close()
-    game_conn.close()
-    return question
-
-def get_all_syllabus_links(subject):
+            WHERE id IN ({placeholders})
+        """, missing)
+        for row in c.fetchall():
+            rows[row[0]] = row
+            cache.put("question", (subject, None), (version, row[0]), row)
+        conn.close()
+    return [rows[question_id] for question_id in question_ids if question_id in rows]
+
+def draw_unreviewed_question(subject, user_id, candidate_mask):
     """
-    Retrieve all unique syllabus links from the database.
+    Pick a random question from the candidate bitmap that the user has not reviewed yet.
+    The set difference runs on the cached bitmaps; only the chosen row is read from the DB.
     """
+    index = get_question_index(subject)
+    reviewed_mask = get_reviewed_mask(subject, user_id)
+    question_id = pick_random_id(index, candidate_mask & ~reviewed_mask)
+    if question_id is None:
+        return None
+    return fetch_question(subject, question_id)
+
+def get_random_question(subject, user_id):
+    index = get_question_index(subject)
+    return draw_unreviewed_question(subject, user_id, index["all_mask"])
+
+def get_random_question_by_paper(subject, paper, user_id):
+    index = get_question_index(subject)
+    return draw_unreviewed_question(subject, user_id, index["paper_masks"].get(paper, 0))
+
+def _load_syllabus_links(subject):
     conn = get_db_connection(subject)
     cursor = conn.cursor()
 
@@ -119,60 +99,21 @@ def get_all_syllabus_links(subject):
     conn.close()
     return sorted(raw_links)  # Sort the links alphabetically for consistency
 
+def get_all_syllabus_links(subject):
+    """
+    Retrieve all unique syllabus links from the database, cached per question-DB version.
+    """
+    return cache.get_or_load("syllabus_links", (subject, None), None,
+                             lambda: _load_syllabus_links(subject),
+                             source_version=get_db_version(subject))
+
 def get_questions_by_syllabus(subject, selected_syllabus, user_id):
     """
     Retrieve a single random question filtered by the selected syllabus link.
     """
-    game_conn = connect_game_db()
-    g = game_conn.cursor()
-    conn = get_db_connection(subject)
-    c = conn.cursor()
-
-    if subject == "Chemistry":
-        g.execute("""
-               SELECT question_id FROM user_progress_chemistry
-               WHERE reviewed = 1 AND user_id = ?
-           """, (user_id,))
-    else:
-        g.execute("""
-              SELECT question_id FROM user_progress_physics
-              WHERE reviewed = 1 AND user_id = ?
-          """, (user_id,))
-    reviewed_ids = [row[0] for row in g.fetchall()]
-
-    # Normalize the selected syllabus
-    selected_syllabus = selected_syllabus.strip()
-
-    if reviewed_ids:
-        placeholders = ",".join("?" for _ in reviewed_ids)
-        query = f"""
-               SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
-               FROM questions
-               WHERE (syllabus_link LIKE ? OR syllabus_link LIKE ?)
-                 AND id NOT IN ({placeholders})
-               ORDER BY RANDOM()
-               LIMIT 1
-           """
-        params = [f"%{selected_syllabus}%", f"%||{selected_syllabus}%"] + reviewed_ids
-        c.execute(query, params)
-    else:
-        query = """
-               SELECT id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html
-               FROM questions
-               WHERE syllabus_link LIKE ? OR syllabus_link LIKE ?
-               ORDER BY RANDOM()
-               LIMIT 1
-           """
-        c.execute(query, [f"%{selected_syllabus}%", f"%||{selected_syllabus}%"])
-
-    question = c.fetchone()
-
-    # Debugging: Log the fetched question
-    print(f"Fetched question: {question}")
-
-    conn.close()
-    game_conn.close()
-    return question
-
-
+    # Normalize the selected syllabus and look it up in the syllabus trie
+    node = find_syllabus_node(get_syllabus_trie(subject), selected_syllabus.strip())
+    if node is None:
+        return None
 
+    return draw_unreviewed_question(subject, user_id, node["mask"])
@@ -0,0 +1,171 @@
+import random
+import threading
+from collections import OrderedDict
+
+from backend.database import get_db_connection, get_db_version
+
+# Number of set bits in every possible byte, used to walk bitmaps quickly
+_BYTE_POPCOUNT = [bin(value).count("1") for value in range(256)]
+
+# Process-wide cache: (subject, db_version) -> index, least recently used first
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_build_locks = {}  # (subject, db_version) -> lock held while that index is built
+# Versions kept per subject, so sessions still on the previous one do not rebuild it
+MAX_CACHED_VERSIONS = 2
+
+
+def should_exclude_question(reference_code, paper):
+    """
+    Determine if a question should be excluded based on its reference_code and paper type.
+
+    - Exclude questions if the part after the last full stop in the reference_code is not numeric.
+    - Do not exclude Paper 1B questions.
+    """
+    if paper == "1B":  # Always include Paper 1B questions
+        return False
+
+    # Extract the part after the last full stop
+    last_part = reference_code.split(".")[-1]
+
+    # Exclude if the last part is not numeric
+    return not last_part.isdigit()
+
+def parse_marks(maximum_marks):
+    """
+    Return maximum_marks as an int, treating missing or malformed values as 0.
+    """
+    try:
+        return int(maximum_marks)
+    except (TypeError, ValueError):
+        return 0
+
+def build_question_index(rows):
+    """
+    Build a dense index over (id, paper, reference_code, syllabus_link, maximum_marks, level) rows.
+
+    Question IDs are sorted and numbered 0..n-1, so any set of questions can be held
+    as a Python int bitmap where bit i stands for index["ids"][i]. The index holds:
+    - "ids": the question IDs in bit order
+    - "positions": {question_id: bit}
+    - "rows": the metadata rows in bit order
+    - "all_mask": every question
+    - "valid_mask": questions not excluded by should_exclude_question
+    - "paper_masks": {paper: questions on that paper}
+    - "level_masks": {level: questions at that level}
+    - "marks": maximum marks of each question in bit order
+    - "marks_masks": {maximum marks: questions worth that many marks}
+    """
+    rows = sorted(rows, key=lambda row: row[0])
+    index = {
+        "ids": [row[0] for row in rows],
+        "positions": {row[0]: bit for bit, row in enumerate(rows)},
+        "rows": rows,
+    }
+
+    valid_ids = []
+    paper_ids = {}
+    level_ids = {}
+    for question_id, paper, reference_code, syllabus_link, maximum_marks, level in rows:
+        if not should_exclude_question(reference_code or "", paper):
+            valid_ids.append(question_id)
+        paper_ids.setdefault(paper, []).append(question_id)
+        level_ids.setdefault(level, []).append(question_id)
+
+    index["all_mask"] = (1 << len(rows)) - 1
+    index["valid_mask"] = ids_to_mask(index, valid_ids)
+    index["paper_masks"] = {paper: ids_to_mask(index, ids) for paper, ids in paper_ids.items()}
+    index["level_masks"] = {level: ids_to_mask(index, ids) for level, ids in level_ids.items()}
+    index["marks"] = [parse_marks(row[4]) for row in rows]
+    marks_ids = {}
+    for question_id, marks in zip(index["ids"], index["marks"]):
+        marks_ids.setdefault(marks, []).append(question_id)
+    index["marks_masks"] = {marks: ids_to_mask(index, ids) for marks, ids in marks_ids.items()}
+    return index
+
+def get_question_index(subject):
+    """
+    Return the dense question index for the subject, built once per question-DB version
+    and shared by every session in the process.
+    """
+    version = get_db_version(subject)
+    key = (subject, version)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    # Build outside the shared lock, so warming up a new version does not block
+    # sessions reading the current one
+    with build_lock:
+        with _indexes_lock:
+            index = _indexes.get(key)
+        if index is not None:
+            return index
+
+        conn = get_db_connection(subject)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, paper, reference_code, syllabus_link, maximum_marks, level FROM questions")
+        rows = cursor.fetchall()
+        conn.close()
+
+        index = build_question_index(rows)
+        index["version"] = version
+        with _indexes_lock:
+            _indexes[key] = index
+            _build_locks.pop(key, None)
+            cached = [cached_key for cached_key in _indexes if cached_key[0] == subject]
+            for cached_key in cached[:-MAX_CACHED_VERSIONS]:
+                del _indexes[cached_key]
+        return index
+
+def ids_to_mask(index, question_ids):
+    """
+    Convert question IDs to a bitmap. IDs that are not in the index are ignored.
+    """
+    positions = index["positions"]
+    bits = bytearray((len(index["ids"]) + 7) // 8)
+    for question_id in question_ids:
+        bit = positions.get(question_id)
+        if bit is not None:
+            bits[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(bits, "little")
+
+def mask_to_ids(index, mask):
+    """
+    Convert a bitmap back to the list of question IDs it contains, in ID order.
+    """
+    ids = index["ids"]
+    question_ids = []
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for byte_position, byte in enumerate(data):
+        if not byte:
+            continue
+        for bit in range(8):
+            if byte >> bit & 1:
+                question_ids.append(ids[byte_position * 8 + bit])
+    return question_ids
+
+def pick_random_id(index, mask):
+    """
+    Pick a uniformly random question ID from a bitmap, or None if the bitmap is empty.
+    """
+    remaining = mask.bit_count()
+    if not remaining:
+        return None
+
+    target = random.randrange(remaining)
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for byte_position, byte in enumerate(data):
+        count = _BYTE_POPCOUNT[byte]
+        if target >= count:
+            target -= count
+            continue
+        for bit in range(8):
+            if byte >> bit & 1:
+                if target == 0:
+                    return index["ids"][byte_position * 8 + bit]
+                target -= 1
+    return None
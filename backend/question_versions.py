@@ -0,0 +1,236 @@
+"""
+Versioned question DBs that workers switch to without restarting.
+
+    python -m backend.question_versions publish Chemistry path/to/ChemQuestionsDatabase.db
+    python -m backend.question_versions list
+    python -m backend.question_versions activate Chemistry <version>
+    python -m backend.question_versions prune [--keep 3]
+
+Publishing copies the DB with SQLite's backup API into question_dbs/<subject>/<version>.db,
+checks it, precomputes its syllabus trie and similar questions, and then points
+question_dbs/manifest.json at it with an atomic rename, so a worker never sees a
+half-copied file. Workers poll the manifest; on a new version they warm its question
+index, syllabus trie and cached rows in a background thread and only then switch new
+questions over. A session keeps the version of the question it is answering until
+it moves on to its next question.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from backend import cache
+from backend.database import MANIFEST_PATH, QUESTION_DB_DIR, get_active_db, pinned_db_versions, read_manifest, \
+    set_active_db
+from backend.question_handler import fetch_questions, get_all_syllabus_links
+from backend.question_index import get_question_index
+from backend.similar_questions import build_similarity_index
+from backend.syllabus import get_syllabus_trie
+
+SUBJECTS = ["Chemistry", "Physics"]
+MANIFEST_POLL_SECONDS = 10  # How often a worker checks the manifest for new versions
+WARM_ROWS = 500  # Most recently used question rows re-read from a new version before switching
+
+_last_poll = 0.0
+_warming = set()  # (subject, version) being warmed up in this process
+_poll_lock = threading.Lock()
+
+
+def pinned_question_dbs():
+    """
+    Pin the versions active now for one rerun, so every read in it sees the same DB
+    even if a switch happens halfway through.
+    """
+    return pinned_db_versions({subject: get_active_db(subject) for subject in SUBJECTS})
+
+# -------------------------
+# Switching workers over
+# -------------------------
+def warm_question_db(subject, version, path):
+    """
+    Build everything derived from a new version, then make it the active one.
+    """
+    start = time.perf_counter()
+    previous_version = get_active_db(subject)[0]
+    hot_ids = [question_id for row_version, question_id in cache.keys("question", (subject, None))
+               if row_version == previous_version][-WARM_ROWS:]
+    try:
+        with pinned_db_versions({subject: (version, path)}):
+            get_question_index(subject)
+            get_syllabus_trie(subject)
+            get_all_syllabus_links(subject)
+            fetch_questions(subject, hot_ids)
+        set_active_db(subject, version, path)
+        print(f"Switched {subject} to question DB {version} after {time.perf_counter() - start:.2f}s of warm-up")
+    except sqlite3.Error as e:
+        print(f"Could not warm up {subject} question DB {version}: {e}")
+    finally:
+        with _poll_lock:
+            _warming.discard((subject, version))
+
+def refresh_question_dbs_if_due():
+    """
+    Check the manifest at most every MANIFEST_POLL_SECONDS and warm up any new
+    version in a background thread. Cheap enough to call on every rerun.
+    """
+    global _last_poll
+    with _poll_lock:
+        now = time.monotonic()
+        if now - _last_poll < MANIFEST_POLL_SECONDS:
+            return
+        _last_poll = now
+
+    for subject, entry in read_manifest().items():
+        if subject not in SUBJECTS or entry["version"] == get_active_db(subject)[0]:
+            continue
+        if not os.path.exists(entry["path"]):
+            continue
+        with _poll_lock:
+            if (subject, entry["version"]) in _warming:
+                continue
+            _warming.add((subject, entry["version"]))
+        threading.Thread(target=warm_question_db, args=(subject, entry["version"], entry["path"]),
+                         daemon=True).start()
+
+# -------------------------
+# Publishing
+# -------------------------
+def _subject_dir(subject):
+    return os.path.join(QUESTION_DB_DIR, subject)
+
+def _file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _check_question_db(path):
+    """
+    Raise ValueError unless path is an intact question DB.
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise ValueError(f"{path} failed quick_check: {result}")
+        if not conn.execute("PRAGMA table_info(questions)").fetchall():
+            raise ValueError(f"{path} has no questions table")
+    except sqlite3.Error as e:
+        raise ValueError(f"{path} is not a question DB: {e}")
+    finally:
+        conn.close()
+
+def _write_manifest(subject, version):
+    """
+    Point the manifest at a version with an atomic rename.
+    """
+    manifest = {name: {"version": entry["version"], "path": os.path.relpath(entry["path"], QUESTION_DB_DIR)}
+                for name, entry in read_manifest().items()}
+    manifest[subject] = {"version": version, "path": os.path.join(subject, f"{version}.db")}
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def publish_question_db(subject, source_path):
+    """
+    Copy a question DB in as a new version, precompute what is derived from it and
+    make it current. Returns the version.
+    """
+    _check_question_db(source_path)
+    os.makedirs(_subject_dir(subject), exist_ok=True)
+
+    # The backup API copies a consistent snapshot even if the source is being written
+    tmp_path = os.path.join(_subject_dir(subject), f".{os.getpid()}.tmp")
+    source = sqlite3.connect(f"file:{os.path.abspath(source_path)}?mode=ro", uri=True)
+    target = sqlite3.connect(tmp_path)
+    source.backup(target)
+    target.close()
+    source.close()
+    _check_question_db(tmp_path)
+
+    version = f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{_file_digest(tmp_path)[:8]}"
+    path = os.path.join(_subject_dir(subject), f"{version}.db")
+    os.replace(tmp_path, path)
+
+    with pinned_db_versions({subject: (version, path)}):
+        get_syllabus_trie(subject)  # Persisted next to the DB for every worker
+        question_count = build_similarity_index(subject)
+    _write_manifest(subject, version)
+    print(f"Published {subject} question DB {version} with {question_count} questions")
+    return version
+
+def list_versions(subject):
+    """
+    Return the published versions of a subject, oldest first.
+    """
+    if not os.path.isdir(_subject_dir(subject)):
+        return []
+    # Skip the files derived from each version, e.g. <version>.db.similar.db
+    return sorted(name[:-len(".db")] for name in os.listdir(_subject_dir(subject))
+                  if name.endswith(".db") and name.count(".") == 1)
+
+def activate_version(subject, version):
+    """
+    Point the manifest back at an already published version, e.g. to roll back.
+    """
+    if version not in list_versions(subject):
+        raise ValueError(f"{subject} has no published version {version}")
+    _write_manifest(subject, version)
+
+def prune_versions(keep=3):
+    """
+    Delete all but the newest `keep` versions of each subject, never the current one.
+    Sessions still on a deleted version move to the current one. Returns the number deleted.
+    """
+    manifest = read_manifest()
+    deleted = 0
+    for subject in SUBJECTS:
+        current = manifest.get(subject, {}).get("version")
+        versions = list_versions(subject)
+        for version in versions[:max(len(versions) - keep, 0)]:
+            if version == current:
+                continue
+            for name in os.listdir(_subject_dir(subject)):
+                if name.startswith(f"{version}.db"):  # The DB and its .syllabus.json and .similar.db
+                    os.remove(os.path.join(_subject_dir(subject), name))
+            deleted += 1
+    return deleted
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish and manage versions of the question DBs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    publish_parser = subparsers.add_parser("publish", help="Publish a question DB as the new current version.")
+    publish_parser.add_argument("subject", choices=SUBJECTS)
+    publish_parser.add_argument("source", help="Path of the question DB to publish.")
+    subparsers.add_parser("list", help="List the published versions.")
+    activate_parser = subparsers.add_parser("activate", help="Make a published version current again.")
+    activate_parser.add_argument("subject", choices=SUBJECTS)
+    activate_parser.add_argument("version")
+    prune_parser = subparsers.add_parser("prune", help="Delete old versions.")
+    prune_parser.add_argument("--keep", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        publish_question_db(args.subject, args.source)
+    elif args.command == "list":
+        manifest = read_manifest()
+        for subject in SUBJECTS:
+            current = manifest.get(subject, {}).get("version")
+            for version in list_versions(subject):
+                print(f"{subject} {version}{' (current)' if version == current else ''}")
+    elif args.command == "activate":
+        activate_version(args.subject, args.version)
+    elif args.command == "prune":
+        print(f"Deleted {prune_versions(args.keep)} versions")
+
+
+if __name__ == "__main__":
+    main()
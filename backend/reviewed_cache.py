@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+from backend.database import connect_game_db, get_progress_table
+from backend.question_index import get_question_index, ids_to_mask
+
+MAX_CACHED_ENTRIES = 2000  # (subject, user) bitmaps kept in memory before LRU eviction
+REVIEWED_TTL_SECONDS = 300  # Bounds how long questions reviewed in other processes can go unseen
+
+# Process-wide LRU cache: (subject, user_id) -> {"version", "expires_at", "reviewed", "lacking_context"}
+# Both bitmaps are over the dense question index of the subject (see question_index.py).
+_entries = OrderedDict()
+_entries_lock = threading.Lock()
+
+
+def _load_entry(subject, user_id, index):
+    """
+    Read the user's reviewed questions for the subject from the game DB into bitmaps.
+    """
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT question_id, lacking_context
+        FROM {get_progress_table(subject)}
+        WHERE reviewed = 1 AND user_id = ?
+    """, (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+
+    return {
+        "version": index["version"],
+        "expires_at": time.monotonic() + REVIEWED_TTL_SECONDS,
+        "reviewed": ids_to_mask(index, [row[0] for row in rows]),
+        "lacking_context": ids_to_mask(index, [row[0] for row in rows if row[1]]),
+    }
+
+def _get_entry(subject, user_id):
+    """
+    Return the cached entry for the user, loading it on first use, after the
+    question database changed or once it expired. Must be called with _entries_lock held.
+    """
+    index = get_question_index(subject)
+    key = (subject, user_id)
+    entry = _entries.get(key)
+    if entry is None or entry["version"] != index["version"] or time.monotonic() >= entry["expires_at"]:
+        entry = _load_entry(subject, user_id, index)
+        _entries[key] = entry
+        while len(_entries) > MAX_CACHED_ENTRIES:
+            _entries.popitem(last=False)
+    _entries.move_to_end(key)
+    return entry
+
+def get_reviewed_mask(subject, user_id):
+    """
+    Return the bitmap of questions the user has reviewed for the subject.
+    """
+    with _entries_lock:
+        return _get_entry(subject, user_id)["reviewed"]
+
+def count_reviewed(subject, user_id, mask):
+    """
+    Count the reviewed questions in the bitmap that were not marked as lacking context.
+    """
+    with _entries_lock:
+        entry = _get_entry(subject, user_id)
+        return (entry["reviewed"] & ~entry["lacking_context"] & mask).bit_count()
+
+def _cached_entry_and_bit(subject, user_id, question_id):
+    """
+    Return the cached entry and the question's bit, or (None, None) if the user is not
+    cached or the question is unknown. Must be called with _entries_lock held.
+    """
+    entry = _entries.get((subject, user_id))
+    if entry is None:
+        return None, None
+    index = get_question_index(subject)
+    if entry["version"] != index["version"]:
+        # The question database changed; the entry is reloaded on next use
+        del _entries[(subject, user_id)]
+        return None, None
+    return entry, index["positions"].get(question_id)
+
+def mark_reviewed(subject, user_id, question_id, lacking_context):
+    """
+    Record a reviewed question in the cached bitmaps after it was written to the game DB.
+    Users that are not cached are left alone; they are loaded from the DB on next use.
+    """
+    with _entries_lock:
+        entry, bit = _cached_entry_and_bit(subject, user_id, question_id)
+        if bit is None:
+            return
+        entry["reviewed"] |= 1 << bit
+        if lacking_context:
+            entry["lacking_context"] |= 1 << bit
+        else:
+            entry["lacking_context"] &= ~(1 << bit)
+
+def unmark_reviewed(subject, user_id, question_id):
+    """
+    Remove a question from the cached bitmaps after its progress row was deleted.
+    """
+    with _entries_lock:
+        entry, bit = _cached_entry_and_bit(subject, user_id, question_id)
+        if bit is None:
+            return
+        entry["reviewed"] &= ~(1 << bit)
+        entry["lacking_context"] &= ~(1 << bit)
+
+def clear_reviewed(subject, user_id):
+    """
+    Empty the cached bitmaps after the user's progress for the subject was reset.
+    """
+    with _entries_lock:
+        entry = _entries.get((subject, user_id))
+        if entry is not None:
+            entry["reviewed"] = 0
+            entry["lacking_context"] = 0
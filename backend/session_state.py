@@ -0,0 +1,125 @@
+import sys
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+from backend.database import get_db_pin, pinned_db_versions
+from backend.question_handler import fetch_question
+
+MAX_QUESTION_FLAGS = 20  # Questions per session whose Show/Hide toggles are remembered
+
+# Sessions only hold question IDs; full rows are resolved through the process-wide
+# cache behind fetch_question, which every session shares.
+
+# -------------------------
+# Current question per practice mode
+# -------------------------
+def set_current_question(slot, subject, question):
+    """
+    Remember the question shown in a practice mode (e.g. "random_question").
+    Only (subject, question_id, question-DB pin) is kept in the session; question
+    may be None when no questions are left.
+    """
+    st.session_state[slot] = (subject, question[0] if question else None, get_db_pin(subject))
+
+def clear_current_question(slot):
+    """
+    Forget the question of a practice mode so a new one is fetched.
+    """
+    st.session_state.pop(slot, None)
+
+def has_current_question(slot, subject):
+    """
+    True if a question (or the fact that none are left) is stored for this mode and subject.
+    """
+    stored = st.session_state.get(slot)
+    return stored is not None and stored[0] == subject
+
+def get_current_question(slot):
+    """
+    Return the full row of the question stored for a practice mode, or None.
+    The row comes from the question-DB version the question was drawn from, so a
+    newly published version only takes over from the next question.
+    """
+    stored = st.session_state.get(slot)
+    if stored is None or stored[1] is None:
+        return None
+    subject, question_id, pin = stored
+    with pinned_db_versions({subject: pin}):
+        return fetch_question(subject, question_id)
+
+def note_question_shown(question_id):
+    """
+    Remember when a question was first shown, to measure time on task.
+    """
+    shown = st.session_state.get("question_shown_at")
+    if shown is None or shown[0] != question_id:
+        st.session_state.question_shown_at = (question_id, time.time())
+
+def seconds_on_question(question_id):
+    """
+    Seconds since the question was first shown, or None if that is unknown.
+    """
+    shown = st.session_state.get("question_shown_at")
+    if shown is None or shown[0] != question_id:
+        return None
+    return time.time() - shown[1]
+
+# -------------------------
+# Per-question UI flags
+# -------------------------
+def _question_flags():
+    if "question_flags" not in st.session_state:
+        st.session_state.question_flags = OrderedDict()
+    return st.session_state.question_flags
+
+def get_question_flag(subject, question_id, flag):
+    """
+    Return whether a Show/Hide flag (e.g. "markscheme") is on for a question.
+    """
+    return flag in _question_flags().get((subject, question_id), ())
+
+def toggle_question_flag(subject, question_id, flag):
+    """
+    Flip a Show/Hide flag for a question.
+    Only flags that are on are stored, and only for the most recent questions.
+    Question ids are only unique within a subject, so flags are keyed by both.
+    """
+    flags = _question_flags()
+    question_flags = flags.pop((subject, question_id), set())
+    question_flags ^= {flag}
+    if question_flags:
+        flags[(subject, question_id)] = question_flags
+        while len(flags) > MAX_QUESTION_FLAGS:
+            flags.popitem(last=False)
+
+# -------------------------
+# Memory reporting
+# -------------------------
+def _deep_sizeof(value, seen):
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    return size
+
+def session_memory_usage():
+    """
+    Estimate the memory held by this session's state.
+    Returns (total_bytes, [(key, bytes), ...]) with the largest entries first.
+    """
+    seen = set()
+    entries = []
+    for key in list(st.session_state.keys()):
+        try:
+            value = st.session_state[key]
+        except KeyError:
+            continue
+        entries.append((key, _deep_sizeof(value, seen)))
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    return sum(size for _, size in entries), entries
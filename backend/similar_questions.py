@@ -0,0 +1,230 @@
+"""
+Precomputed nearest neighbours of every question, for the "Similar Question" button.
+
+    python -m backend.similar_questions build [--subject Chemistry] [--top-k 20]
+
+The build vectorizes each question's text with TF-IDF and appends features for the
+syllabus nodes it is linked to, then stores the top-k most similar questions of each
+one in a sidecar SQLite DB next to the subject DB (<db>.similar.db). Serving is one
+primary-key lookup of the ranked neighbours, filtered by the user's reviewed bitmap.
+"""
+import argparse
+import html
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+from backend.database import get_db_connection, get_db_path, get_db_version
+from backend.question_handler import fetch_question
+from backend.question_index import get_question_index
+from backend.reviewed_cache import get_reviewed_mask
+from backend.syllabus import split_syllabus_link
+
+TOP_K = 20  # Neighbours stored per question
+MAX_FEATURES = 3000  # Most frequent terms kept in the TF-IDF vocabulary
+MIN_DOCUMENT_FREQUENCY = 2  # Terms in fewer questions carry no similarity
+MAX_DOCUMENT_FREQUENCY = 0.5  # Terms in more than this share of questions are stop words
+SYLLABUS_WEIGHT = 0.4  # Share of the similarity that comes from shared syllabus nodes
+BLOCK_SIZE = 512  # Questions whose neighbours are computed per matrix product
+READ_BATCH_SIZE = 1000  # Questions read per query while building
+
+# Schema of the sidecar DB
+SIMILAR_SCHEMA = """
+    CREATE TABLE similar_questions (
+        question_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbour_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (question_id, rank)
+    ) WITHOUT ROWID;
+    CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+_TAG = re.compile(r"<[^>]+>")
+_TOKEN = re.compile(r"[a-z][a-z0-9]+")
+
+
+def sidecar_path(subject):
+    """The neighbour table lives next to the subject's question database."""
+    return f"{get_db_path(subject)}.similar.db"
+
+# -------------------------
+# Building
+# -------------------------
+def tokenize(question_html):
+    text = html.unescape(_TAG.sub(" ", question_html or "")).lower()
+    return _TOKEN.findall(text)
+
+def tfidf_matrix(documents):
+    """
+    Return an L2-normalised (documents x terms) float32 TF-IDF matrix with sublinear
+    term frequencies, over the MAX_FEATURES most common terms that pass the
+    document-frequency limits.
+    """
+    document_frequency = {}
+    for tokens in documents:
+        for token in set(tokens):
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+    max_df = MAX_DOCUMENT_FREQUENCY * len(documents)
+    terms = [term for term, df in document_frequency.items() if MIN_DOCUMENT_FREQUENCY <= df <= max_df]
+    terms = sorted(terms, key=lambda term: (-document_frequency[term], term))[:MAX_FEATURES]
+    columns = {term: column for column, term in enumerate(terms)}
+
+    matrix = np.zeros((len(documents), len(terms)), dtype=np.float32)
+    for row, tokens in enumerate(documents):
+        for token in tokens:
+            column = columns.get(token)
+            if column is not None:
+                matrix[row, column] += 1
+    np.log1p(matrix, out=matrix)
+    idf = np.log((1 + len(documents)) / (1 + np.array([document_frequency[term] for term in terms], dtype=np.float32))) + 1
+    matrix *= idf
+    return _normalise_rows(matrix)
+
+def syllabus_matrix(syllabus_links):
+    """
+    Return an L2-normalised (questions x syllabus nodes) matrix with a 1 for every
+    node on the paths a question is linked to, so deeper shared nodes count more.
+    """
+    columns = {}
+    entries = []
+    for row, syllabus_link in enumerate(syllabus_links):
+        for path in split_syllabus_link(syllabus_link):
+            for depth in range(1, len(path) + 1):
+                column = columns.setdefault(" » ".join(path[:depth]), len(columns))
+                entries.append((row, column))
+    matrix = np.zeros((len(syllabus_links), max(len(columns), 1)), dtype=np.float32)
+    for row, column in entries:
+        matrix[row, column] = 1
+    return _normalise_rows(matrix)
+
+def _normalise_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def nearest_neighbours(vectors, top_k=TOP_K):
+    """
+    Yield (row, [(neighbour row, cosine similarity), ...]) for every row of an
+    L2-normalised matrix, most similar first, working in blocks to bound memory.
+    """
+    k = min(top_k, len(vectors) - 1)
+    if k <= 0:
+        return
+    for start in range(0, len(vectors), BLOCK_SIZE):
+        similarities = vectors[start:start + BLOCK_SIZE] @ vectors.T
+        rows = np.arange(len(similarities))
+        similarities[rows, rows + start] = -np.inf  # A question is not its own neighbour
+        best = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        for offset, candidates in enumerate(best):
+            scores = similarities[offset, candidates]
+            order = np.argsort(-scores)
+            yield start + offset, list(zip(candidates[order].tolist(), scores[order].tolist()))
+
+def build_similarity_index(subject, top_k=TOP_K):
+    """
+    Compute the neighbours of every question of the subject and write them to the
+    sidecar DB, replacing it atomically. Returns the number of questions indexed.
+    """
+    version = get_db_version(subject)
+    question_ids = []
+    documents = []
+    syllabus_links = []
+    # Read in id order a batch at a time, so only the tokens of all questions are held, not their HTML
+    conn = get_db_connection(subject)
+    cursor = conn.cursor()
+    while True:
+        cursor.execute("""
+            SELECT id, html, syllabus_link
+            FROM questions
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (question_ids[-1] if question_ids else -1, READ_BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for question_id, question_html, syllabus_link in rows:
+            question_ids.append(question_id)
+            documents.append(tokenize(question_html))
+            syllabus_links.append(syllabus_link)
+    conn.close()
+
+    text = tfidf_matrix(documents)
+    syllabus = syllabus_matrix(syllabus_links)
+    # Cosine of the concatenation is the weighted sum of the text and syllabus cosines
+    vectors = np.hstack([np.sqrt(1 - SYLLABUS_WEIGHT) * text, np.sqrt(SYLLABUS_WEIGHT) * syllabus])
+
+    path = sidecar_path(subject)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    sidecar = sqlite3.connect(tmp_path)
+    sidecar.executescript(SIMILAR_SCHEMA)
+    sidecar.executemany("INSERT INTO similar_questions VALUES (?, ?, ?, ?)", (
+        (question_ids[row], rank, question_ids[neighbour], score)
+        for row, neighbours in nearest_neighbours(vectors, top_k)
+        for rank, (neighbour, score) in enumerate(neighbours)
+    ))
+    sidecar.executemany("INSERT INTO metadata VALUES (?, ?)", [("db_version", version), ("top_k", str(top_k))])
+    sidecar.commit()
+    sidecar.close()
+    os.replace(tmp_path, path)
+    return len(question_ids)
+
+# -------------------------
+# Serving
+# -------------------------
+def get_similar_question(subject, user_id, question_id):
+    """
+    Return the most similar question the user has not reviewed, or None if there is
+    none or the similarity index has not been built for the current question DB.
+    """
+    path = sidecar_path(subject)
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    cursor = conn.cursor()
+    # A sidecar left over from before the DB was replaced would point at other questions
+    cursor.execute("SELECT value FROM metadata WHERE name = 'db_version'")
+    row = cursor.fetchone()
+    if row is None or row[0] != get_db_version(subject):
+        conn.close()
+        return None
+    cursor.execute("""
+        SELECT neighbour_id
+        FROM similar_questions
+        WHERE question_id = ?
+        ORDER BY rank
+    """, (question_id,))
+    neighbour_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+
+    # Questions removed from the DB since the build are skipped
+    positions = get_question_index(subject)["positions"]
+    reviewed_mask = get_reviewed_mask(subject, user_id)
+    for neighbour_id in neighbour_ids:
+        if neighbour_id in positions and not reviewed_mask >> positions[neighbour_id] & 1:
+            return fetch_question(subject, neighbour_id)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute similar questions for each subject.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Rebuild the similarity index.")
+    build_parser.add_argument("--subject", choices=["Chemistry", "Physics"], action="append",
+                              help="Subject to index (default: both).")
+    build_parser.add_argument("--top-k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    for subject in args.subject or ["Chemistry", "Physics"]:
+        start = time.perf_counter()
+        question_count = build_similarity_index(subject, args.top_k)
+        print(f"{subject}: {question_count} questions indexed in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from backend.database import get_db_path
+from backend.question_index import get_question_index, ids_to_mask, should_exclude_question
+
+LINK_SEPARATOR = "||"  # Separates multiple syllabus links on one question
+LEVEL_SEPARATOR = "»"  # Separates the levels of a single syllabus link
+
+# Process-wide cache: (subject, db_version) -> trie, least recently used first
+# In memory, every node also carries "mask", the bitmap of its "ids" over the question index.
+_tries = OrderedDict()
+_tries_lock = threading.Lock()
+_build_locks = {}  # (subject, db_version) -> lock held while that trie is built
+MAX_CACHED_VERSIONS = 2  # Versions kept per subject, as for the question index
+
+
+def split_syllabus_link(syllabus_link):
+    """
+    Split a raw syllabus_link value into a list of paths, one per linked syllabus entry.
+    Each path is a list of the stripped level names, e.g. [["Structure 1", "1.1"], ...].
+    """
+    paths = []
+    if not syllabus_link:
+        return paths
+    for individual_link in syllabus_link.split(LINK_SEPARATOR):
+        parts = [part.strip() for part in individual_link.split(LEVEL_SEPARATOR) if part.strip()]
+        if parts:
+            paths.append(parts)
+    return paths
+
+def build_syllabus_trie(rows):
+    """
+    Build a syllabus trie from (id, reference_code, paper, syllabus_link) rows.
+
+    Every node is a dict with:
+    - "children": {level name: child node}
+    - "ids": sorted IDs of the questions filed under the node or any descendant
+    - "total": number of those questions
+    - "valid": number of those questions that are not excluded by should_exclude_question
+    A question with several syllabus links is counted once per node.
+    """
+    root = _new_node()
+    for question_id, reference_code, paper, syllabus_link in rows:
+        valid = not should_exclude_question(reference_code or "", paper)
+        for parts in split_syllabus_link(syllabus_link):
+            node = root
+            _add_question(node, question_id, valid)
+            for part in parts:
+                if part not in node["children"]:
+                    node["children"][part] = _new_node()
+                node = node["children"][part]
+                _add_question(node, question_id, valid)
+    return _finalise_node(root)
+
+def _new_node():
+    return {"children": {}, "ids": set(), "valid_ids": set()}
+
+def _add_question(node, question_id, valid):
+    node["ids"].add(question_id)
+    if valid:
+        node["valid_ids"].add(question_id)
+
+def _finalise_node(node):
+    """
+    Replace the working sets of a node with sorted ID lists and counts, recursively.
+    """
+    return {
+        "children": {part: _finalise_node(node["children"][part]) for part in sorted(node["children"])},
+        "ids": sorted(node["ids"]),
+        "total": len(node["ids"]),
+        "valid": len(node["valid_ids"]),
+    }
+
+def _trie_file_path(subject):
+    """The persisted trie lives next to the subject's question database."""
+    return f"{get_db_path(subject)}.syllabus.json"
+
+def _load_persisted_trie(subject, version):
+    """
+    Load the persisted trie for this DB version, or None if it is missing or outdated.
+    """
+    try:
+        with open(_trie_file_path(subject), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != version:
+        return None
+    return data.get("trie")
+
+def _persist_trie(subject, version, trie):
+    """
+    Write the trie to disk atomically so other workers can skip the rebuild.
+    Failing to persist is not fatal; the trie is still cached in memory.
+    """
+    path = _trie_file_path(subject)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "trie": trie}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not persist syllabus trie for {subject}: {e}")
+
+def _attach_masks(node, index):
+    """
+    Add the bitmap of each node's questions, so per-user counts are bitwise operations.
+    """
+    node["mask"] = ids_to_mask(index, node["ids"])
+    for child in node["children"].values():
+        _attach_masks(child, index)
+
+def get_syllabus_trie(subject):
+    """
+    Return the syllabus trie for the subject.
+    The trie is built once per question-DB version, persisted next to the database
+    and shared by every session in the process.
+    """
+    index = get_question_index(subject)
+    key = (subject, index["version"])
+    with _tries_lock:
+        trie = _tries.get(key)
+        if trie is not None:
+            _tries.move_to_end(key)
+            return trie
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    with build_lock:
+        with _tries_lock:
+            trie = _tries.get(key)
+        if trie is not None:
+            return trie
+
+        trie = _load_persisted_trie(subject, index["version"])
+        if trie is None:
+            trie = build_syllabus_trie(
+                (question_id, reference_code, paper, syllabus_link)
+                for question_id, paper, reference_code, syllabus_link, maximum_marks, level in index["rows"]
+            )
+            _persist_trie(subject, index["version"], trie)
+        _attach_masks(trie, index)
+        with _tries_lock:
+            _tries[key] = trie
+            _build_locks.pop(key, None)
+            cached = [cached_key for cached_key in _tries if cached_key[0] == subject]
+            for cached_key in cached[:-MAX_CACHED_VERSIONS]:
+                del _tries[cached_key]
+        return trie
+
+def find_syllabus_node(trie, path):
+    """
+    Return the node for a " » "-joined syllabus path, or None if it is not in the trie.
+    """
+    node = trie
+    for part in path.split(LEVEL_SEPARATOR):
+        part = part.strip()
+        if not part:
+            continue
+        node = node["children"].get(part)
+        if node is None:
+            return None
+    return node
+
+def count_unreviewed(node, reviewed_mask):
+    """
+    Count the questions under a node that the user has not reviewed yet.
+    """
+    return (node["mask"] & ~reviewed_mask).bit_count()
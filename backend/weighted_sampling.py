@@ -0,0 +1,250 @@
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from backend.database import connect_game_db, get_progress_table
+from backend.question_handler import fetch_question
+from backend.question_index import MAX_CACHED_VERSIONS, get_question_index, mask_to_ids
+from backend.reviewed_cache import get_reviewed_mask
+from backend.syllabus import split_syllabus_link
+
+DUE_AFTER_DAYS = 7  # Questions answered mostly wrongly come back into the pool after this long
+REBUILD_AFTER_CHANGES = 25  # Progress changes absorbed before the weights are recomputed
+MAX_REJECTIONS = 32  # Draws that may hit already-answered questions before rebuilding
+MAX_CACHED_TABLES = 500  # (subject, user) alias tables kept in memory before LRU eviction
+
+# Process-wide LRU cache: (subject, user_id) -> alias table (see build_alias_table)
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+_build_locks = {}  # (subject, user_id) -> lock held while that table is built
+_answered_while_building = {}  # (subject, user_id) -> questions answered during the build, None once discarded
+
+# Process-wide cache: (subject, db_version) -> top-level syllabus topic of each index position
+_topics = OrderedDict()
+_topics_lock = threading.Lock()
+
+
+def weakness(correct, partial, incorrect):
+    """
+    Smoothed error rate of a group of answers: 0.5 with no data, towards 1 when mostly wrong.
+    """
+    return (incorrect + 0.5 * partial + 1) / (correct + partial + incorrect + 2)
+
+def build_alias_table(question_ids, weights):
+    """
+    Build a Walker/Vose alias table so a question can be drawn in O(1)
+    with probability proportional to its weight.
+    """
+    n = len(question_ids)
+    total = sum(weights)
+    prob = [0.0] * n
+    alias = [0] * n
+    if not n or total <= 0:
+        return {"ids": list(question_ids), "prob": [1.0] * n, "alias": list(range(n))}
+
+    scaled = [weight * n / total for weight in weights]
+    small = [i for i, value in enumerate(scaled) if value < 1.0]
+    large = [i for i, value in enumerate(scaled) if value >= 1.0]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        if scaled[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+    for i in small + large:
+        prob[i] = 1.0
+        alias[i] = i
+    return {"ids": list(question_ids), "prob": prob, "alias": alias}
+
+def draw_from_alias_table(table):
+    """
+    Draw one question ID from an alias table, or None if it is empty.
+    """
+    n = len(table["ids"])
+    if not n:
+        return None
+    i = random.randrange(n)
+    if random.random() >= table["prob"][i]:
+        i = table["alias"][i]
+    return table["ids"][i]
+
+def _load_progress_rows(subject, user_id):
+    conn = connect_game_db()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT question_id, correct_count, partially_correct_count, incorrect_count, lacking_context, updated_at
+        FROM {get_progress_table(subject)}
+        WHERE user_id = ? AND reviewed = 1
+    """, (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_index_topics(subject, index):
+    """
+    Return the top-level syllabus topic of every position in the question index,
+    worked out once per question-DB version rather than on every table rebuild.
+    """
+    key = (subject, index["version"])
+    with _topics_lock:
+        topics = _topics.get(key)
+        if topics is not None:
+            _topics.move_to_end(key)
+            return topics
+
+    topics = []
+    for row in index["rows"]:
+        paths = split_syllabus_link(row[3])
+        topics.append(paths[0][0] if paths else None)
+    with _topics_lock:
+        topics = _topics.setdefault(key, topics)
+        cached = [cached_key for cached_key in _topics if cached_key[0] == subject]
+        for cached_key in cached[:-MAX_CACHED_VERSIONS]:
+            del _topics[cached_key]
+    return topics
+
+def compute_question_weights(subject, user_id):
+    """
+    Weight every unreviewed or due question by how weak the user is on its
+    top-level syllabus topic and on its paper. Returns (question_ids, weights).
+    """
+    index = get_question_index(subject)
+    positions = index["positions"]
+    rows = index["rows"]
+    topics = get_index_topics(subject, index)
+
+    # Sum past outcomes per topic and per paper
+    topic_stats = {}
+    paper_stats = {}
+    due_ids = []
+    due_cutoff = (datetime.now(timezone.utc) - timedelta(days=DUE_AFTER_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    for question_id, correct, partial, incorrect, lacking_context, updated_at in _load_progress_rows(subject, user_id):
+        if question_id not in positions or lacking_context:
+            continue
+        for stats, key in ((topic_stats, topics[positions[question_id]]), (paper_stats, rows[positions[question_id]][1])):
+            totals = stats.setdefault(key, [0, 0, 0])
+            totals[0] += correct or 0
+            totals[1] += partial or 0
+            totals[2] += incorrect or 0
+        # Due again only while wrong answers still outweigh right ones, so one slip on a
+        # question answered correctly many times does not bring it back
+        if (incorrect or 0) + 0.5 * (partial or 0) > (correct or 0) and updated_at and updated_at < due_cutoff:
+            due_ids.append(question_id)
+
+    question_ids = mask_to_ids(index, index["all_mask"] & ~get_reviewed_mask(subject, user_id)) + due_ids
+    weights = []
+    for question_id in question_ids:
+        topic_weakness = weakness(*topic_stats.get(topics[positions[question_id]], (0, 0, 0)))
+        paper_weakness = weakness(*paper_stats.get(rows[positions[question_id]][1], (0, 0, 0)))
+        weights.append(topic_weakness * paper_weakness)
+    return question_ids, weights
+
+def _build_user_table(subject, user_id):
+    table = build_alias_table(*compute_question_weights(subject, user_id))
+    table["version"] = get_question_index(subject)["version"]
+    table["answered"] = set()  # Questions answered since the table was built
+    table["changes"] = 0
+    return table
+
+def _is_current(table, version):
+    return (table is not None
+            and table["version"] == version
+            and table["changes"] < REBUILD_AFTER_CHANGES
+            and len(table["answered"]) * 2 <= len(table["ids"]))
+
+def _get_table(subject, user_id):
+    """
+    Return the user's alias table, rebuilding it when it is missing, built for another
+    question-DB version or has absorbed too many changes.
+    """
+    key = (subject, user_id)
+    version = get_question_index(subject)["version"]
+    with _tables_lock:
+        table = _tables.get(key)
+        if _is_current(table, version):
+            _tables.move_to_end(key)
+            return table
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    # Build outside the shared lock, so one user's rebuild does not block
+    # every other session's draws and answers
+    with build_lock:
+        with _tables_lock:
+            table = _tables.get(key)
+            if _is_current(table, version):
+                return table
+            _answered_while_building[key] = set()
+
+        table = _build_user_table(subject, user_id)
+        with _tables_lock:
+            # Answers recorded while the progress rows were being read may be missing from them
+            answered = _answered_while_building.pop(key, None)
+            _build_locks.pop(key, None)
+            if answered is None:
+                # Progress was removed during the build; use the table once but do not keep it
+                return table
+            table["answered"] |= answered
+            _tables[key] = table
+            _tables.move_to_end(key)
+            while len(_tables) > MAX_CACHED_TABLES:
+                _tables.popitem(last=False)
+        return table
+
+def _draw_unanswered(table):
+    for _ in range(MAX_REJECTIONS):
+        question_id = draw_from_alias_table(table)
+        if question_id is None or question_id not in table["answered"]:
+            return question_id
+    return None
+
+def draw_weighted_question(subject, user_id):
+    """
+    Draw a question for the user, favouring topics and papers they do worst on.
+    Questions answered since the table was built are rejected and redrawn, which
+    keeps draws O(1) on average between rebuilds.
+    """
+    table = _get_table(subject, user_id)
+    with _tables_lock:
+        question_id = _draw_unanswered(table)
+        rebuild = question_id is None and table["answered"]
+        if rebuild and _tables.get((subject, user_id)) is table:
+            # Unlucky run of rejections; rebuild the table and draw again
+            del _tables[(subject, user_id)]
+    if rebuild:
+        table = _get_table(subject, user_id)
+        with _tables_lock:
+            question_id = _draw_unanswered(table)
+
+    if question_id is None:
+        return None
+    return fetch_question(subject, question_id)
+
+def note_answered(subject, user_id, question_id):
+    """
+    Take an answered question out of the user's table until the next rebuild,
+    when its new outcome is folded into the topic and paper weights.
+    """
+    key = (subject, user_id)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            table["answered"].add(question_id)
+            table["changes"] += 1
+        if _answered_while_building.get(key) is not None:
+            _answered_while_building[key].add(question_id)
+
+def discard_table(subject, user_id):
+    """
+    Drop the user's table after progress was removed, so it is rebuilt on the next draw.
+    """
+    key = (subject, user_id)
+    with _tables_lock:
+        _tables.pop(key, None)
+        if key in _answered_while_building:
+            # A build in flight may have read the removed progress
+            _answered_while_building[key] = None
@@ -0,0 +1,249 @@
+"""
+Concurrent-session load test that drives the real app through streamlit.testing.
+
+    python load_test.py --sessions 200 --iterations 3
+
+Every simulated student logs in, takes questions in each practice mode, marks
+answers and opens History and Analytics, all against a scratch copy of the game
+DB. The report lists, per scenario, reruns, throughput, tail latency, "database is locked"
+errors and the size of the rendered elements sent to the browser.
+
+AppTest keeps one Streamlit runtime per process, so sessions are spread over
+worker processes and each worker interleaves its sessions one rerun at a time.
+Up to --processes reruns hit the DBs at once.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(APP_DIR, "streamlit_app.py")
+LOAD_TEST_PASSWORD = "load-test-password"
+
+
+def _payload_bytes(node):
+    """
+    Approximate the websocket payload of a rerun by the serialized size of every element
+    under a block, e.g. at.main or at.sidebar.
+    """
+    size = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None and hasattr(proto, "ByteSize"):
+        size += proto.ByteSize()
+    for child in getattr(node, "children", {}).values():
+        size += _payload_bytes(child)
+    return size
+
+def _find(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    return None
+
+def _run(at, scenario, results):
+    """
+    Rerun the app, then append (scenario, start time, seconds, payload bytes, error message or None)
+    to results. Start times are wall-clock so reruns from every worker process can be lined up.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        at.run()
+    except Exception as e:  # A timed-out or crashed rerun still counts as a failed request
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    if error is None and len(at.exception):
+        error = at.exception[0].value
+    results.append((scenario, started_at, elapsed, _payload_bytes(at.main) + _payload_bytes(at.sidebar), error))
+
+def _mark_answer(at, scenario, results):
+    button = _find(at.button, "Correct")
+    if button is not None:
+        button.click()
+        _run(at, scenario, results)
+
+def _select(at, option, scenario, results):
+    """
+    Pick an option in whichever sidebar selectbox offers it, e.g. "History" or "By Paper".
+    """
+    for selectbox in at.sidebar.selectbox:
+        if option in selectbox.options:
+            selectbox.select(option)
+            _run(at, scenario, results)
+            return
+
+def _session_steps(username, iterations, timeout, results):
+    """
+    One simulated student. Yields after every rerun so a worker can interleave sessions.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+    _run(at, "open", results)
+    yield
+    _find(at.text_input, "Username").input(username)
+    _find(at.text_input, "Password").input(LOAD_TEST_PASSWORD)
+    _find(at.button, "Login").click()
+    _run(at, "login", results)
+    yield
+
+    for _ in range(iterations):
+        _select(at, "Practice", "practice", results)
+        yield
+
+        _select(at, "Random", "random", results)
+        yield
+        _mark_answer(at, "random_answer", results)
+        yield
+
+        _select(at, "By Paper", "paper", results)
+        yield
+        paper_type = _find(at.sidebar.selectbox, "Paper Type")
+        if paper_type is not None:
+            paper_type.select("1B")
+            _run(at, "paper_filter", results)
+        yield
+        _mark_answer(at, "paper_answer", results)
+        yield
+
+        _select(at, "By Syllabus", "syllabus", results)
+        yield
+        _mark_answer(at, "syllabus_answer", results)
+        yield
+
+        _select(at, "By Filters", "filters", results)
+        level = _find(at.sidebar.multiselect, "Level")
+        if level is not None:
+            level.select("HL")
+            _run(at, "filters_change", results)
+        yield
+        _mark_answer(at, "filters_answer", results)
+        yield
+
+        _select(at, "Mock Paper", "mock_paper", results)
+        build = _find(at.sidebar.button, "Build Mock Paper")
+        if build is not None:
+            build.click()
+            _run(at, "mock_paper_build", results)
+            yield
+            for radio in at.radio:
+                radio.set_value("Correct")
+            submit = _find(at.button, "Submit Mock Paper")
+            if submit is not None:
+                submit.click()
+                _run(at, "mock_paper_submit", results)
+        yield
+
+        _select(at, "History", "history", results)
+        yield
+        _select(at, "Analytics", "analytics", results)
+        yield
+
+def run_worker(usernames, iterations, timeout):
+    """
+    Run several sessions in this process, advancing each by one rerun in turn.
+    Returns this process's results.
+    """
+    results = []
+    sessions = [_session_steps(username, iterations, timeout, results) for username in usernames]
+    while sessions:
+        for session in list(sessions):
+            try:
+                next(session)
+            except StopIteration:
+                sessions.remove(session)
+            except Exception as e:  # The page did not render what the session expected
+                results.append(("session_aborted", time.time(), 0.0, 0, f"{type(e).__name__}: {e}"))
+                sessions.remove(session)
+    return results
+
+def create_load_test_users(count):
+    """
+    Insert the simulated students into the (scratch) game DB, sharing one password hash.
+    """
+    from backend.auth import hash_password
+    from backend.database import connect_game_db
+
+    password_hash = hash_password(LOAD_TEST_PASSWORD)
+    usernames = [f"load_test_{i}" for i in range(count)]
+    conn = connect_game_db()
+    conn.executemany(
+        "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+        [(username, password_hash) for username in usernames],
+    )
+    conn.commit()
+    conn.close()
+    return usernames
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(results, wall_seconds):
+    scenarios = {}
+    for scenario, started_at, elapsed, payload, error in results:
+        scenarios.setdefault(scenario, []).append((started_at, elapsed, payload, error))
+
+    print(f"{'scenario':<18}{'reruns':>8}{'per s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'locked':>8}{'errors':>8}{'avg KB':>9}")
+    for scenario, rows in scenarios.items():
+        latencies = [elapsed * 1000 for _, elapsed, _, _ in rows]
+        # Throughput over the scenario's wall span, from its first rerun starting to its last finishing
+        span = max(started_at + elapsed for started_at, elapsed, _, _ in rows) - min(row[0] for row in rows)
+        throughput = len(rows) / span if span > 0 else 0.0
+        locked = sum(1 for _, _, _, error in rows if error and "database is locked" in error)
+        errors = sum(1 for _, _, _, error in rows if error)
+        payload_kb = sum(payload for _, _, payload, _ in rows) / len(rows) / 1024
+        print(f"{scenario:<18}{len(rows):>8}{throughput:>8.1f}{_percentile(latencies, 0.5):>9.0f}"
+              f"{_percentile(latencies, 0.95):>9.0f}{_percentile(latencies, 0.99):>9.0f}{max(latencies):>9.0f}"
+              f"{locked:>8}{errors:>8}{payload_kb:>9.1f}")
+
+    print(f"\n{len(results)} reruns in {wall_seconds:.1f}s ({len(results) / wall_seconds:.1f} reruns/s)")
+    failures = [error for _, _, _, _, error in results if error]
+    if failures:
+        print(f"First error: {failures[0]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many concurrent app sessions against local DB files.")
+    parser.add_argument("--sessions", type=int, default=50, help="Simulated students.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Worker processes running reruns in parallel.")
+    parser.add_argument("--iterations", type=int, default=2, help="Passes through every mode per student.")
+    parser.add_argument("--game-db", default=os.path.join(APP_DIR, "questions_game.db"),
+                        help="Game DB to copy for the test; the original is never written.")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds before a rerun counts as failed.")
+    args = parser.parse_args()
+
+    # Point the backend at a scratch copy of the game DB before it is imported
+    scratch_dir = tempfile.mkdtemp(prefix="load_test_")
+    scratch_db = os.path.join(scratch_dir, "questions_game.db")
+    if os.path.exists(args.game_db):
+        source = sqlite3.connect(args.game_db)
+        target = sqlite3.connect(scratch_db)
+        source.backup(target)
+        source.close()
+        target.close()
+    os.environ["GAME_DB_PATH"] = scratch_db
+    os.chdir(APP_DIR)  # The app reads its CSS and question DBs relative to the project root
+    sys.path.insert(0, APP_DIR)
+
+    usernames = create_load_test_users(args.sessions)
+    processes = max(1, min(args.processes, args.sessions))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(run_worker, usernames[i::processes], args.iterations, args.timeout)
+                   for i in range(processes)]
+        for future in futures:
+            results.extend(future.result())
+    report(results, time.perf_counter() - start)
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
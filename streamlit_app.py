@@ -1,10 +1,37 @@
+from datetime import datetime, timezone
+
 import streamlit as st
 
-from backend.database import get_db_connection, connect_game_db
-from backend.question_handler import get_random_question, get_random_question_by_paper, get_questions_by_syllabus, get_all_syllabus_links
+from backend.question_handler import get_random_question, get_random_question_by_paper, get_questions_by_syllabus
 from backend.progress import update_progress, get_progress, reset_progress, mark_as_lacking_context, \
-    remove_question_from_progress
+    remove_question_from_progress, get_recent_progress, get_answer_totals
+from backend.reviewed_cache import get_reviewed_mask
+from backend.session_state import set_current_question, clear_current_question, has_current_question, \
+    get_current_question, get_question_flag, toggle_question_flag, session_memory_usage, note_question_shown, \
+    seconds_on_question
+from backend.attempts import compact_attempts_if_due, load_daily_rollups, summarize_daily_rollups
+from backend.syllabus import get_syllabus_trie, count_unreviewed
+from backend.facets import FACETS, facet_values, facet_counts, syllabus_counts, draw_faceted_question
+from backend.question_index import get_question_index
+from backend.weighted_sampling import draw_weighted_question
+from backend.mock_paper import create_mock_paper, load_mock_paper, submit_mock_paper
+from backend.practice_queues import serve_question, paper_queue_key, syllabus_queue_key, RANDOM_QUEUE, \
+    WEIGHTED_QUEUE
 from backend.auth import show_signup, show_login
+from backend.profiling import run_profiled
+from backend.similar_questions import get_similar_question
+from backend.predicted_grades import get_predicted_grades
+from backend.question_versions import pinned_question_dbs, refresh_question_dbs_if_due
+
+FACET_LABELS = {"paper": "Paper", "level": "Level", "maximum_marks": "Maximum Marks"}
+ALL_TOPICS = "All topics"
+# Mode -> session slot holding the question shown in that mode
+QUESTION_SLOTS = {
+    "Random": "random_question",
+    "By Paper": "current_paper_question",
+    "By Syllabus": "current_syllabus_question",
+    "By Filters": "faceted_question",
+}
 
 def main():
     # If not logged in, show login or signup
@@ -27,12 +54,6 @@ def main():
     if "selected_syllabus" not in st.session_state:
         st.session_state.selected_syllabus = None
 
-    if "previous_syllabus" not in st.session_state:
-        st.session_state.previous_syllabus = None
-
-    if "current_syllabus_question" not in st.session_state:
-        st.session_state.current_syllabus_question = None
-
     st.sidebar.title("Subject")
     if "subject" not in st.session_state:
         st.session_state["subject"] = "Chemistry"
@@ -50,75 +71,90 @@ def main():
     if mode == "Practice":
         st.sidebar.title("Practice Modes")
         # Select Mode
-        QuestionMode = st.sidebar.selectbox("Mode", ["Random", "By Paper", "By Syllabus"])
+        QuestionMode = st.sidebar.selectbox("Mode", ["Random", "By Paper", "By Syllabus", "By Filters", "Mock Paper"])
         if QuestionMode == "Random":
+            st.sidebar.checkbox("Focus on weak topics", key="focus_weak_topics")
+
             # Only fetch random question when needed
-            if "random_question" not in st.session_state:
-                st.session_state.random_question = get_random_question(st.session_state["subject"], user_id)
-            display_question(subject, QuestionMode, st.session_state.random_question, user_id)
+            if not has_current_question("random_question", subject):
+                set_current_question("random_question", subject, next_random_question(subject, user_id))
+            display_question(subject, QuestionMode, get_current_question("random_question"), user_id)
         elif QuestionMode == "By Paper":
             # Track the paper type in session state
             if "current_paper_type" not in st.session_state:
                 st.session_state.current_paper_type = ""
 
-            if "current_paper_question" not in st.session_state:
-                st.session_state.current_paper_question = None
-
-            # Input for selecting paper type
-            paper = st.sidebar.text_input("Enter Paper Type:")
+            # Offer the papers in the question DB, with how many questions are left on each
+            paper_counts = facet_counts(subject, user_id, {})[0]["paper"]
+            paper_labels = {paper: f"{paper} ({left} left)" for paper, left in paper_counts.items()}
+            paper = st.sidebar.selectbox("Paper Type", facet_values(subject)["paper"], format_func=paper_labels.get)
 
             # Reset question if paper type changes
             if paper != st.session_state.current_paper_type:
                 st.session_state.current_paper_type = paper
-                st.session_state.current_paper_question = None
+                clear_current_question("current_paper_question")
 
             if paper:
                 # Fetch a new random question if needed
-                if st.session_state.current_paper_question is None:
-                    st.session_state.current_paper_question = get_random_question_by_paper(subject, paper, user_id)
+                if not has_current_question("current_paper_question", subject):
+                    set_current_question("current_paper_question", subject,
+                                         next_paper_question(subject, paper, user_id))
 
                 # Display the current question using the centralized function
-                question = st.session_state.current_paper_question
+                question = get_current_question("current_paper_question")
                 display_question(subject, QuestionMode, question, user_id)
 
         elif QuestionMode == "By Syllabus":
-            # Fetch all syllabus links and build hierarchy
-            if "chem_syllabus_links" not in st.session_state:
-                st.session_state.chem_syllabus_links = get_all_syllabus_links("Chemistry")
-            if "phys_syllabus_links" not in st.session_state:
-                st.session_state.phys_syllabus_links = get_all_syllabus_links("Physics")
-
-            st.session_state.chem_syllabus_hierarchy = build_syllabus_hierarchy(st.session_state.chem_syllabus_links)
-            st.session_state.phys_syllabus_hierarchy = build_syllabus_hierarchy(st.session_state.phys_syllabus_links)
+            # The syllabus trie is built once per question database and shared across sessions
+            syllabus_trie = get_syllabus_trie(subject)
+            reviewed_mask = get_reviewed_mask(subject, user_id)
 
             # Render the syllabus hierarchy and get the selected syllabus link
             st.markdown("### Syllabus Hierarchy")
-            if subject == "Chemistry":
-                selected_syllabus = render_syllabus_hierarchy(st.session_state.chem_syllabus_hierarchy)
-            elif subject == "Physics":
-                selected_syllabus = render_syllabus_hierarchy(st.session_state.phys_syllabus_hierarchy)
-            else:
-                selected_syllabus = None
+            selected_syllabus = render_syllabus_hierarchy(syllabus_trie, reviewed_mask)
+            if not selected_syllabus:
+                st.write("No questions left in the syllabus!")
 
             # Check if the selected syllabus has changed
             if selected_syllabus != st.session_state.selected_syllabus:
                 st.session_state.selected_syllabus = selected_syllabus
-                st.session_state.current_syllabus_question = None  # Reset the current question
+                clear_current_question("current_syllabus_question")  # Reset the current question
 
             # Fetch and display a question for the selected syllabus link
             if st.session_state.selected_syllabus:
-                if st.session_state.selected_syllabus != st.session_state.previous_syllabus:
-                    st.session_state.previous_syllabus = st.session_state.selected_syllabus
-                    st.session_state.current_syllabus_question = get_questions_by_syllabus(subject,
-                                                                                           st.session_state.selected_syllabus,
-                                                                                           user_id)
+                if not has_current_question("current_syllabus_question", subject):
+                    set_current_question("current_syllabus_question", subject,
+                                         next_syllabus_question(subject, st.session_state.selected_syllabus, user_id))
 
                 # Display the fetched question
-                if st.session_state.current_syllabus_question:
-                    display_question(subject, QuestionMode, st.session_state.current_syllabus_question, user_id)
+                question = get_current_question("current_syllabus_question")
+                if question:
+                    display_question(subject, QuestionMode, question, user_id)
                 else:
                     st.write("No questions available for this syllabus link!")
 
+        elif QuestionMode == "By Filters":
+            selection, syllabus, total = render_facet_filters(subject, user_id)
+            st.sidebar.caption(f"{total} questions left match these filters")
+
+            # Reset the question if any filter changes
+            if (selection, syllabus) != st.session_state.get("facet_selection"):
+                st.session_state.facet_selection = (selection, syllabus)
+                clear_current_question("faceted_question")
+
+            if not has_current_question("faceted_question", subject):
+                set_current_question("faceted_question", subject,
+                                     draw_faceted_question(subject, user_id, selection, syllabus))
+
+            question = get_current_question("faceted_question")
+            if question:
+                display_question(subject, QuestionMode, question, user_id)
+            else:
+                st.write("No questions left that match these filters!")
+
+        elif QuestionMode == "Mock Paper":
+            show_mock_paper(subject, user_id)
+
         # Progress Bar
         reviewed, total = get_progress(subject, user_id)
         st.sidebar.write(f"Progress: {reviewed}/{total}")
@@ -139,8 +175,8 @@ def main():
             with col1:
                 if st.button("Yes, Reset"):
                     reset_progress(subject, user_id)  # Call the reset function
-                    st.session_state.random_question = get_random_question(subject,
-                                                                           user_id)  # Fetch a new random question
+                    set_current_question("random_question", subject,
+                                         next_random_question(subject, user_id))  # Fetch a new random question
                     st.session_state.confirm_reset = False  # Reset confirmation state
                     st.rerun()  # Reload the app
             with col2:
@@ -151,61 +187,49 @@ def main():
     elif mode == "Analytics":
         show_analytics(subject, user_id)
 
+    # Report how much memory this session's state is holding
+    session_bytes, _ = session_memory_usage()
+    st.sidebar.caption(f"Session memory: {session_bytes / 1024:.1f} KB")
 
-# Cache progress data to prevent repetitive queries
-@st.cache_data
-def load_progress(subject, user_id):
-    return get_progress(subject, user_id)
-
-def apply_css_to_html(html_content):
+def question_css():
     """
-    Combine the external CSS with the provided HTML content.
+    Return the external CSS as one <style> block.
     """
     with open("application-a4c8c647abf5b5225a333b85c9518fa4c88c8b07cfba1dc4e8615725b03c4807.css", "r") as f:
         css1 = f.read()
     with open("print-53b80e997a3acfa1245d39590bda6f1f0b2720b92c225d009afd1743db97aaf1.css", "r") as f:
         css2 = f.read()
+    return f"<style>{css1}\n{css2}</style>"
 
-    # Inline the CSS with the HTML
-    inline_css = f"<style>{css1}\n{css2}</style>"
-    return f"{inline_css}\n{html_content}"
-
-def build_syllabus_hierarchy(links):
+def apply_css_to_html(html_content):
     """
-    Build a hierarchical structure from syllabus links.
-    Handles multiple syllabus links and nested levels.
+    Combine the external CSS with the provided HTML content.
     """
-    hierarchy = {}
-    for link in links:
-        # Handle multiple syllabus links for a single question
-        individual_links = [l.strip() for l in link.split("||") if l.strip()]
-        for individual_link in individual_links:
-            # Create a hierarchy for the current link
-            parts = [part.strip() for part in individual_link.split("»") if part.strip()]
-            current_level = hierarchy
-            for part in parts:
-                if part not in current_level:
-                    current_level[part] = {}
-                current_level = current_level[part]
-    return hierarchy
-
-def render_syllabus_hierarchy(hierarchy):
+    # Inline the CSS with the HTML
+    return f"{question_css()}\n{html_content}"
+
+def render_syllabus_hierarchy(trie, reviewed_mask):
     """
     Render the syllabus hierarchy interactively and return the selected syllabus link.
+    Each option shows how many unreviewed questions it holds; empty branches are skipped.
     """
-    current_level = hierarchy
+    current_node = trie
     selected_parts = []
 
     # Iterate through the hierarchy levels
     for depth in range(10):  # Assume a max depth of 10 levels
-        if not current_level:
+        children = current_node["children"]
+        if not children:
             break
 
-        # Create a unique key for each level of the hierarchy
-        options = list(current_level.keys())
+        # Only offer branches that still have questions left for this user
+        remaining = {part: count_unreviewed(child, reviewed_mask) for part, child in children.items()}
+        options = [part for part, left in remaining.items() if left > 0]
         if not options:
             break
+        labels = {part: f"{part} ({remaining[part]} left)" for part in options}
 
+        # Create a unique key for each level of the hierarchy
         selected_key = f"selected_level_{depth}"
         default_value = st.session_state.get(selected_key, options[0])
 
@@ -215,15 +239,71 @@ def render_syllabus_hierarchy(hierarchy):
             options,
             index=options.index(default_value) if default_value in options else 0,
             key=selected_key,
+            format_func=labels.get,
         )
 
         # Save the selected part
         selected_parts.append(selected)
-        current_level = current_level[selected]
+        current_node = children[selected]
 
     # Combine selected parts into a full path
     return " » ".join(selected_parts)
 
+def render_facet_filters(subject, user_id):
+    """
+    Render filters for paper, level, maximum marks and syllabus node. Every option is
+    labelled with the unreviewed questions it leaves, given the other filters.
+    Returns (selection, syllabus, questions left for the whole selection).
+    """
+    values = facet_values(subject)
+    trie = get_syllabus_trie(subject)
+
+    # Read the filters before rendering them, so every label reflects the current choice.
+    # Values of another subject or question-DB version are dropped, as they are no longer options.
+    selection = {facet: [value for value in st.session_state.get(f"facet_{facet}", []) if value in values[facet]]
+                 for facet in FACETS}
+    syllabus_parts = []
+    node = trie
+    for depth in range(10):
+        part = st.session_state.get(f"facet_syllabus_{depth}")
+        if part not in node["children"]:
+            break
+        syllabus_parts.append(part)
+        node = node["children"][part]
+    syllabus = " » ".join(syllabus_parts) or None
+    counts, total = facet_counts(subject, user_id, selection, syllabus)
+
+    st.sidebar.title("Filters")
+    for facet, label in FACET_LABELS.items():
+        labels = {value: f"{value} ({counts[facet][value]})" for value in values[facet]}
+        # The labels change with the counts, which makes a new widget; carry the choice over
+        st.sidebar.multiselect(label, values[facet], default=selection[facet], key=f"facet_{facet}",
+                               format_func=labels.get)
+
+    # Drill down the syllabus one level at a time; "All topics" stops at the current node
+    node = trie
+    for depth in range(10):
+        if not node["children"]:
+            break
+        remaining = syllabus_counts(subject, user_id, selection, node)
+        options = [ALL_TOPICS] + list(node["children"])
+        labels = {part: f"{part} ({remaining[part]})" for part in node["children"]}
+        labels[ALL_TOPICS] = ALL_TOPICS
+        selected_key = f"facet_syllabus_{depth}"
+        default_value = st.session_state.get(selected_key, ALL_TOPICS)  # Not an option if the parent changed
+        part = st.sidebar.selectbox(
+            f"Syllabus Level {depth + 1}",
+            options,
+            index=options.index(default_value) if default_value in options else 0,
+            key=selected_key,
+            format_func=labels.get,
+        )
+        if part == ALL_TOPICS:
+            break
+        node = node["children"][part]
+
+    return selection, syllabus, total
+
 def display_question(subject, QuestionMode, question, user_id):
     if question:
         question_id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html = question
@@ -242,35 +322,30 @@ def display_question(subject, QuestionMode, question, user_id):
 
         # Render the styled HTML ar
         st.markdown(styled_html, unsafe_allow_html=True)
+        note_question_shown(question_id)
 
         # Show/Hide Markscheme Logic
-        if f"show_markscheme_{question_id}" not in st.session_state:
-            st.session_state[f"show_markscheme_{question_id}"] = False
-
         if st.button(
-            "Show Markscheme" if not st.session_state[f"show_markscheme_{question_id}"] else "Hide Markscheme",
-            key=f"markscheme_toggle_{question_id}",
+            "Show Markscheme" if not get_question_flag(subject, question_id, "markscheme") else "Hide Markscheme",
+            key=f"markscheme_toggle_{subject}_{question_id}",
         ):
-            st.session_state[f"show_markscheme_{question_id}"] = not st.session_state[f"show_markscheme_{question_id}"]
+            toggle_question_flag(subject, question_id, "markscheme")
             st.rerun()  # Immediately refresh the app
 
-        if st.session_state[f"show_markscheme_{question_id}"]:
+        if get_question_flag(subject, question_id, "markscheme"):
             st.markdown("### Markscheme")
             st.markdown(styled_markscheme_html, unsafe_allow_html=True)
 
         # Show Examiner Notes Logic (only if examiner_report_html is not empty)
         if examiner_report_html and examiner_report_html.strip():
-            if f"show_examiner_notes_{question_id}" not in st.session_state:
-                st.session_state[f"show_examiner_notes_{question_id}"] = False
-
             if st.button(
-                "Show Examiner Notes" if not st.session_state[f"show_examiner_notes_{question_id}"] else "Hide Examiner Notes",
-                key=f"examiner_notes_toggle_{question_id}",
+                "Show Examiner Notes" if not get_question_flag(subject, question_id, "examiner_notes") else "Hide Examiner Notes",
+                key=f"examiner_notes_toggle_{subject}_{question_id}",
             ):
-                st.session_state[f"show_examiner_notes_{question_id}"] = not st.session_state[f"show_examiner_notes_{question_id}"]
+                toggle_question_flag(subject, question_id, "examiner_notes")
                 st.rerun()  # Immediately refresh the app
 
-            if st.session_state[f"show_examiner_notes_{question_id}"]:
+            if get_question_flag(subject, question_id, "examiner_notes"):
                 st.markdown("### Examiner Notes")
                 st.markdown(examiner_report_html, unsafe_allow_html=True)
 
@@ -278,17 +353,17 @@ def display_question(subject, QuestionMode, question, user_id):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             if st.button("Correct", key=f"correct_{question_id}"):
-                update_progress(subject, question_id, "correct", user_id)
+                update_progress(subject, question_id, "correct", user_id, seconds_on_question(question_id))
                 load_next_question(subject, QuestionMode, user_id)
                 st.rerun()
         with col2:
             if st.button("Partially Correct", key=f"partially_correct_{question_id}"):
-                update_progress(subject, question_id, "partially_correct", user_id)
+                update_progress(subject, question_id, "partially_correct", user_id, seconds_on_question(question_id))
                 load_next_question(subject, QuestionMode, user_id)
                 st.rerun()
         with col3:
             if st.button("Incorrect", key=f"incorrect_{question_id}"):
-                update_progress(subject, question_id, "incorrect", user_id)
+                update_progress(subject, question_id, "incorrect", user_id, seconds_on_question(question_id))
                 load_next_question(subject, QuestionMode, user_id)
                 st.rerun()
         with col4:
@@ -296,18 +371,124 @@ def display_question(subject, QuestionMode, question, user_id):
                 mark_as_lacking_context(subject, question_id, user_id)
                 load_next_question(subject, QuestionMode, user_id)
                 st.rerun()
+
+        # Swap to the closest unreviewed question without recording an answer
+        if QuestionMode in QUESTION_SLOTS and st.button("Similar Question", key=f"similar_{question_id}"):
+            similar = get_similar_question(subject, user_id, question_id)
+            if similar:
+                set_current_question(QUESTION_SLOTS[QuestionMode], subject, similar)
+                st.rerun()
+            st.info("No similar unreviewed question found.")
     else:
         st.write("No more questions available!")
 
+def next_random_question(subject, user_id):
+    """
+    Draw the next Random-mode question, weighted towards weak topics if the user asked for it.
+    Questions come from the user's precomputed queue, or are drawn live when it runs out.
+    """
+    if st.session_state.get("focus_weak_topics"):
+        return serve_question(subject, user_id, WEIGHTED_QUEUE, lambda: draw_weighted_question(subject, user_id))
+    return serve_question(subject, user_id, RANDOM_QUEUE, lambda: get_random_question(subject, user_id))
+
+def next_paper_question(subject, paper, user_id):
+    return serve_question(subject, user_id, paper_queue_key(paper),
+                          lambda: get_random_question_by_paper(subject, paper, user_id))
+
+def next_syllabus_question(subject, syllabus, user_id):
+    return serve_question(subject, user_id, syllabus_queue_key(syllabus),
+                          lambda: get_questions_by_syllabus(subject, syllabus, user_id))
+
 def load_next_question(subject, mode, user_id):
     if mode == "Random":
-        st.session_state.random_question = get_random_question(subject, user_id)
+        set_current_question("random_question", subject, next_random_question(subject, user_id))
     elif mode == "By Paper":
         paper = st.session_state.current_paper_type
-        st.session_state.current_paper_question = get_random_question_by_paper(subject, paper, user_id)
+        set_current_question("current_paper_question", subject, next_paper_question(subject, paper, user_id))
     elif mode == "By Syllabus":
         syllabus = st.session_state.selected_syllabus
-        st.session_state.current_syllabus_question = get_questions_by_syllabus(subject, syllabus, user_id)
+        set_current_question("current_syllabus_question", subject, next_syllabus_question(subject, syllabus, user_id))
+    elif mode == "By Filters":
+        selection, syllabus = st.session_state.facet_selection
+        set_current_question("faceted_question", subject, draw_faceted_question(subject, user_id, selection, syllabus))
+
+def clear_mock_paper_answers(mock_paper_id):
+    """
+    Drop the answers marked on a mock paper from the session once it is submitted or replaced.
+    """
+    prefix = f"mock_{mock_paper_id}_"
+    for key in [key for key in st.session_state if key.startswith(prefix)]:
+        del st.session_state[key]
+
+def show_mock_paper(subject, user_id):
+    """
+    Build a whole practice paper of unreviewed questions, render it at once
+    and record every answer in one batch when it is submitted.
+    """
+    index = get_question_index(subject)
+    papers = sorted(paper for paper in index["paper_masks"] if paper)
+    levels = sorted(level for level in index["level_masks"] if level)
+    if not papers or not levels:
+        st.write("No questions available for mock papers!")
+        return
+
+    paper = st.sidebar.selectbox("Paper", papers)
+    level = st.sidebar.selectbox("Level", levels)
+    target_marks = st.sidebar.number_input("Total Marks", min_value=1, max_value=200, value=40)
+
+    if st.sidebar.button("Build Mock Paper"):
+        if st.session_state.get("mock_paper_id"):
+            clear_mock_paper_answers(st.session_state.mock_paper_id)
+        st.session_state.mock_paper_id = create_mock_paper(subject, user_id, paper, level, int(target_marks))
+        if st.session_state.mock_paper_id is None:
+            st.sidebar.warning("No unreviewed questions match this paper and level.")
+
+    mock_paper_id = st.session_state.get("mock_paper_id")
+    mock_paper = load_mock_paper(mock_paper_id, user_id) if mock_paper_id else None
+    if not mock_paper or mock_paper["subject"] != subject or mock_paper["submitted_at"]:
+        st.write("Choose a paper, level and total marks, then build a mock paper.")
+        return
+
+    # The paper is drawn in one slot that submitting empties before the rerun, so the answer
+    # radios of the submitted paper do not outlive their popped session keys
+    paper_slot = st.empty()
+    with paper_slot.container():
+        st.markdown(
+            f"### Mock Paper {mock_paper['paper']} ({mock_paper['level']}) "
+            f"- {mock_paper['total_marks']} marks, {len(mock_paper['questions'])} questions"
+        )
+        started_at = datetime.strptime(mock_paper["created_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        elapsed_minutes = int((datetime.now(timezone.utc) - started_at).total_seconds() // 60)
+        st.markdown(f"**Time elapsed:** {elapsed_minutes} min")
+
+        # The styles apply to the whole page, so they are sent once rather than with every question
+        st.markdown(question_css(), unsafe_allow_html=True)
+        statuses = {"Correct": "correct", "Partially Correct": "partially_correct", "Incorrect": "incorrect"}
+        results = {}
+        for position, question in enumerate(mock_paper["questions"], 1):
+            question_id, html, paper, reference_code, syllabus_link, maximum_marks, level, markscheme_html, examiner_report_html = question
+
+            st.markdown(f"#### Question {position} ({maximum_marks} marks)")
+            st.markdown(f"**Reference Code:** {reference_code}")
+            st.markdown(html, unsafe_allow_html=True)
+            with st.expander("Markscheme"):
+                st.markdown(markscheme_html, unsafe_allow_html=True)
+
+            outcome = st.radio("Result", list(statuses), index=None, horizontal=True,
+                               key=f"mock_{mock_paper_id}_{question_id}")
+            if outcome:
+                results[question_id] = statuses[outcome]
+
+        if st.button("Submit Mock Paper"):
+            if len(results) < len(mock_paper["questions"]):
+                st.error("Mark every question before submitting the paper.")
+            else:
+                elapsed_seconds = (datetime.now(timezone.utc) - started_at).total_seconds()
+                submit_mock_paper(mock_paper_id, subject, user_id, results, elapsed_seconds / len(results))
+                paper_slot.empty()
+                clear_mock_paper_answers(mock_paper_id)
+                st.session_state.mock_paper_id = None
+                st.rerun()
 
 def debug_syllabus_hierarchy(hierarchy, level=0):
     """
@@ -327,67 +508,28 @@ def show_history(subject, user_id):
     """
     Displays the 30 most recently answered questions for the given user,
     fetching user_progress rows from questions_game.db,
-    then fetching question details from ChemQuestionsDatabase.db.
+    then looking up question details in the index of the question database.
     """
 
     # -------------------------------
     # 1) Fetch user_progress from questions_game.db
     # -------------------------------
-    game_conn = connect_game_db()
-    game_cursor = game_conn.cursor()
-
-    # Suppose we store the last updated time in 'updated_at'
-    # and we only want to show questions where reviewed=1
-    if subject=="Chemistry":
-        query = """
-                    SELECT question_id,
-                           correct_count,
-                           partially_correct_count,
-                           incorrect_count,
-                           updated_at
-                    FROM user_progress_chemistry
-                    WHERE user_id = ? AND reviewed = 1
-                    ORDER BY updated_at DESC
-                    LIMIT 30
-                """
-    elif subject=="Physics":
-        query = """
-                    SELECT question_id,
-                           correct_count,
-                           partially_correct_count,
-                           incorrect_count,
-                           updated_at
-                    FROM user_progress_physics
-                    WHERE user_id = ? AND reviewed = 1
-                    ORDER BY updated_at DESC
-                    LIMIT 30
-                """
-    else:
-        query = None
-    game_cursor.execute(query, (user_id,))
-    progress_rows = game_cursor.fetchall()
-
-    game_conn.close()
+    # Only reviewed questions, most recently updated first; cached until the next answer
+    progress_rows = get_recent_progress(subject, user_id)
 
     if not progress_rows:
         st.write("No recently answered questions to show.")
         return
 
     # -------------------------------
-    # 2) For each question_id, look up question info in ChemQuestionsDatabase.db
+    # 2) For each question_id, look up question info in the question index
     # -------------------------------
-    conn = get_db_connection(subject)
-    cursor = conn.cursor()
+    index = get_question_index(subject)
 
     final_results = []
     for (q_id, correct, partial, incorrect, updated_at) in progress_rows:
-        # Retrieve the question data from the chem DB
-        cursor.execute("""
-            SELECT reference_code, paper
-            FROM questions
-            WHERE id = ?
-        """, (q_id,))
-        question_row = cursor.fetchone()
+        # Retrieve the question data from the in-memory index of the question DB
+        question_row = index["rows"][index["positions"][q_id]] if q_id in index["positions"] else None
         col1, col2 = st.columns(2)
         # "Show Question" button
         with col1:
@@ -398,11 +540,11 @@ def show_history(subject, user_id):
         # "Remove from Progress" button
         with col2:
             if st.button("Remove from History", key=f"remove_{q_id}"):
-                remove_question_from_progress(q_id, user_id)
+                remove_question_from_progress(subject, q_id, user_id)
                 st.success(f"Removed question {q_id} from your progress.")
                 st.rerun()
         if question_row:
-            reference_code, paper = question_row
+            paper, reference_code = question_row[1], question_row[2]
             final_results.append({
                 "question_id": q_id,
                 "reference_code": reference_code,
@@ -413,9 +555,6 @@ def show_history(subject, user_id):
                 "updated_at": updated_at
             })
 
-
-    conn.close()
-
     # -------------------------------
     # 3) Display the combined data
     # -------------------------------
@@ -429,29 +568,8 @@ def show_history(subject, user_id):
         )
 
 def show_analytics(subject, user_id):
-    conn = connect_game_db()
-    cursor = conn.cursor()
-
     # 1) Count correct, partial, incorrect for the user
-    if subject == "Chemistry":
-        query = """
-                    SELECT SUM(correct_count), SUM(partially_correct_count), SUM(incorrect_count)
-                    FROM user_progress_chemistry
-                    WHERE user_id = ?
-                """
-    elif subject == "Physics":
-        query = """
-                    SELECT SUM(correct_count), SUM(partially_correct_count), SUM(incorrect_count)
-                    FROM user_progress_physics
-                    WHERE user_id = ?
-                """
-    else:
-        query = None
-    cursor.execute(query, (user_id,))
-    correct_total, partial_total, incorrect_total = cursor.fetchone()
-    correct_total = correct_total or 0
-    partial_total = partial_total or 0
-    incorrect_total = incorrect_total or 0
+    correct_total, partial_total, incorrect_total = get_answer_totals(subject, user_id)
 
     st.write("### Overall Performance")
     st.write(f"**Correct:** {correct_total}")
@@ -467,7 +585,35 @@ def show_analytics(subject, user_id):
     df = pd.DataFrame(data)
     st.bar_chart(data=df, x="Status", y="Count")
 
-    conn.close()
+    # Predicted grade from the marks each answer would have earned
+    grades = get_predicted_grades(subject, user_id)
+    if not grades.empty:
+        st.write("### Predicted Grade")
+        overall = grades.iloc[0]
+        col1, col2 = st.columns(2)
+        col1.metric("Predicted Grade", int(overall["Predicted Grade"]))
+        col2.metric("Estimated Marks", f"{overall['Predicted %']:.0f}%")
+        st.dataframe(grades, hide_index=True)
+
+    # 3) Accuracy over time, streaks and time on task from the daily rollups
+    compact_attempts_if_due()
+    calendar, summary = summarize_daily_rollups(load_daily_rollups(subject, user_id))
+    if calendar.empty:
+        st.write("Answer some questions to see your progress over time.")
+        return
+
+    st.write("### Progress Over Time")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Current Streak", f"{summary['current_streak']} days")
+    col2.metric("Longest Streak", f"{summary['longest_streak']} days")
+    col3.metric("Time on Task", f"{calendar['minutes'].sum():.0f} min")
+
+    st.write("**Accuracy (7-day rolling)**")
+    st.line_chart(calendar["rolling_accuracy"])
+    st.write("**Minutes per Day**")
+    st.bar_chart(calendar["minutes"])
 
 if __name__ == "__main__":
-    main()
+    refresh_question_dbs_if_due()
+    with pinned_question_dbs():
+        run_profiled(main)
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Point the backend at scratch DBs before any test imports it; importing
+# backend.database creates the game DB
+_tmp_dir = tempfile.mkdtemp(prefix="backend_tests_")
+os.environ["CHEM_DB_PATH"] = os.path.join(_tmp_dir, "ChemQuestionsDatabase.db")
+os.environ["PHYS_DB_PATH"] = os.path.join(_tmp_dir, "PhysicsQuestionsDataBase.db")
+os.environ["GAME_DB_PATH"] = os.path.join(_tmp_dir, "questions_game.db")
+os.environ["QUESTION_DB_DIR"] = os.path.join(_tmp_dir, "question_dbs")
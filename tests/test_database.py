@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from backend.database import create_game_database
+
+# Progress table as created by early versions, keyed on question_id alone
+LEGACY_PROGRESS_SCHEMA = """
+    CREATE TABLE {table} (
+        question_id INTEGER PRIMARY KEY,
+        correct_count INTEGER DEFAULT 0,
+        partially_correct_count INTEGER DEFAULT 0,
+        incorrect_count INTEGER DEFAULT 0,
+        reviewed BOOLEAN DEFAULT 0,
+        lacking_context BOOLEAN DEFAULT 0,
+        user_id INTEGER,
+        updated_at TIMESTAMP
+    )
+"""
+ROWS = [(1, 2, 0, 1, 1, 0, 7, "2024-01-01 10:00:00"), (2, 0, 1, 0, 1, 0, 8, "2024-01-02 10:00:00")]
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def _primary_key(conn, table):
+    return [row[1] for row in sorted(conn.execute(f"PRAGMA table_info({table})"), key=lambda row: row[5]) if row[5]]
+
+
+def test_legacy_progress_tables_are_rekeyed(tmp_path):
+    path = str(tmp_path / "questions_game.db")
+    conn = sqlite3.connect(path)
+    for table in ("user_progress_chemistry", "user_progress_physics"):
+        conn.execute(LEGACY_PROGRESS_SCHEMA.format(table=table))
+    conn.executemany("INSERT INTO user_progress_chemistry VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+
+    create_game_database(path)
+
+    conn = sqlite3.connect(path)
+    assert _primary_key(conn, "user_progress_chemistry") == ["user_id", "question_id"]
+    assert _primary_key(conn, "user_progress_physics") == ["user_id", "question_id"]
+    assert sorted(conn.execute("SELECT * FROM user_progress_chemistry")) == ROWS
+    assert not {"user_progress_chemistry_legacy", "user_progress_physics_legacy"} & _tables(conn)
+    conn.close()
+
+def test_interrupted_migration_is_finished(tmp_path):
+    path = str(tmp_path / "questions_game.db")
+    create_game_database(path)
+    # A process died after moving the old table aside and creating the new one
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_PROGRESS_SCHEMA.format(table="user_progress_chemistry_legacy"))
+    conn.executemany("INSERT INTO user_progress_chemistry_legacy VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+
+    create_game_database(path)
+
+    conn = sqlite3.connect(path)
+    assert sorted(conn.execute("SELECT * FROM user_progress_chemistry")) == ROWS
+    assert "user_progress_chemistry_legacy" not in _tables(conn)
+    conn.close()
+
+def test_migration_is_rolled_back_on_failure(tmp_path):
+    path = str(tmp_path / "questions_game.db")
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_PROGRESS_SCHEMA.format(table="user_progress_chemistry"))
+    conn.executemany("INSERT INTO user_progress_chemistry VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ROWS)
+    # Makes a later CREATE TABLE fail after the rename
+    conn.execute("CREATE VIEW users AS SELECT 1")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(sqlite3.Error):
+        create_game_database(path)
+
+    conn = sqlite3.connect(path)
+    assert _primary_key(conn, "user_progress_chemistry") == ["question_id"]
+    assert sorted(conn.execute("SELECT * FROM user_progress_chemistry")) == ROWS
+    assert "user_progress_chemistry_legacy" not in _tables(conn)
+    conn.close()
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+
+from backend.database import connect_game_db, create_game_database
+from backend.predicted_grades import get_predicted_grades
+
+QUESTIONS = [
+    (1, "<p>q1</p>", "1A", "22M.1A.SL.TZ1.1", "Structure 1. Models » 1.1 Intro", "4", "SL", "", ""),
+    (2, "<p>q2</p>", "2", "22M.2.HL.TZ1.2", "Reactivity 1. Energy » 1.2 Enthalpy", "6", "HL", "", ""),
+]
+
+
+def setup_module():
+    conn = sqlite3.connect(os.environ["CHEM_DB_PATH"])
+    conn.execute("""
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY,
+            html TEXT,
+            paper TEXT,
+            reference_code TEXT,
+            syllabus_link TEXT,
+            maximum_marks TEXT,
+            level TEXT,
+            markscheme_html TEXT,
+            examiner_report_html TEXT
+        )
+    """)
+    conn.executemany("INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", QUESTIONS)
+    conn.commit()
+    conn.close()
+    create_game_database()
+
+
+def test_user_without_answers_gets_empty_report():
+    grades = get_predicted_grades("Chemistry", 1)
+    assert grades.empty
+    assert list(grades.columns) == ["Group", "Name", "Estimated Marks", "Available Marks",
+                                    "Predicted %", "Predicted Grade"]
+
+
+def test_report_sums_marks_per_group():
+    conn = connect_game_db()
+    conn.executemany("""
+        INSERT INTO user_progress_chemistry (question_id, user_id, correct_count, partially_correct_count, reviewed)
+        VALUES (?, 2, ?, ?, 1)
+    """, [(1, 1, 0), (2, 0, 1)])
+    conn.commit()
+    conn.close()
+
+    grades = get_predicted_grades("Chemistry", 2).set_index(["Group", "Name"])
+    assert grades.loc[("Overall", "All questions"), "Estimated Marks"] == 7
+    assert grades.loc[("Overall", "All questions"), "Available Marks"] == 10
+    assert grades.loc[("Paper", "2"), "Predicted %"] == 50
+    assert grades.loc[("Syllabus", "Structure 1. Models"), "Predicted Grade"] == 7
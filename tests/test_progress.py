@@ -0,0 +1,42 @@
+import os
+import sqlite3
+
+from backend.database import create_game_database
+from backend.progress import get_progress, update_progress
+
+# Questions 4 and 5 are parts of multipart questions, which should_exclude_question leaves out
+QUESTIONS = [
+    (1, "<p>q1</p>", "1A", "22M.1A.SL.TZ1.1", "A. Space, time and motion » A.1 Kinematics", "1", "SL", "", ""),
+    (2, "<p>q2</p>", "2", "22M.2.HL.TZ1.2", "A. Space, time and motion » A.2 Forces", "6", "HL", "", ""),
+    (3, "<p>q3</p>", "2", "22M.2.SL.TZ1.3", "B. The particulate nature of matter » B.1 Thermal energy", "4", "SL", "", ""),
+    (4, "<p>q4</p>", "2", "22M.2.SL.TZ1.4a", "A. Space, time and motion » A.1 Kinematics", "2", "SL", "", ""),
+    (5, "<p>q5</p>", "2", "22M.2.SL.TZ1.4b", "A. Space, time and motion » A.1 Kinematics", "3", "SL", "", ""),
+]
+
+
+def setup_module():
+    conn = sqlite3.connect(os.environ["PHYS_DB_PATH"])
+    conn.execute("""
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY,
+            html TEXT,
+            paper TEXT,
+            reference_code TEXT,
+            syllabus_link TEXT,
+            maximum_marks TEXT,
+            level TEXT,
+            markscheme_html TEXT,
+            examiner_report_html TEXT
+        )
+    """)
+    conn.executemany("INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", QUESTIONS)
+    conn.commit()
+    conn.close()
+    create_game_database()
+
+
+def test_progress_ignores_answers_to_excluded_questions():
+    for question_id in (1, 4, 5):
+        update_progress("Physics", question_id, "correct", 3)
+
+    assert get_progress("Physics", 3) == (1, 3)